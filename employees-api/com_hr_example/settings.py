@@ -129,12 +129,39 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (bulk import jobs)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Cache
+# The employees cache holds pre-rendered list pages; point it to a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache) to share it between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'employees': {
+        'BACKEND': config('EMPLOYEES_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('EMPLOYEES_CACHE_LOCATION', default='employees'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Default logger
+# Default logger. Records of the employees loggers are written by a background
+# thread (a QueueHandler listener, started by employees.log_queue), so file I/O stays
+# off the request path. Log files are flushed in batches of EMPLOYEES_LOG_BATCH_SIZE records,
+# or a second after the first record of a batch that does not fill up.
+LOGGING_CONFIG = 'employees.log_queue.configure_logging'
+EMPLOYEES_LOG_QUEUE = config('EMPLOYEES_LOG_QUEUE', default=True, cast=bool)
+EMPLOYEES_LOG_BATCH_SIZE = config('EMPLOYEES_LOG_BATCH_SIZE', default=100, cast=int)
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -146,6 +173,14 @@ LOGGING = {
         },
     },
 
+    "filters": {
+        # One per-row upload message out of N is kept
+        "sample_upload_rows": {
+            "()": "employees.log_queue.SamplingFilter",
+            "rate": config('EMPLOYEES_LOG_UPLOAD_ROWS_SAMPLE', default=100, cast=int),
+        },
+    },
+
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
@@ -153,15 +188,17 @@ LOGGING = {
         },
         # Setting for All logs
         "file_all": {
-            "class": "logging.FileHandler",
+            "class": "employees.log_queue.BufferedFileHandler",
             "filename": "logs/all.log",
+            "batch_size": EMPLOYEES_LOG_BATCH_SIZE,
             "formatter": "default",
             "level": "INFO",
         },
         # Setting for Error logs
         "file_errors": {
-            "class": "logging.FileHandler",
+            "class": "employees.log_queue.BufferedFileHandler",
             "filename": "logs/errors.log",
+            "batch_size": EMPLOYEES_LOG_BATCH_SIZE,
             "formatter": "default",
             "level": "ERROR",
         },
@@ -173,15 +210,66 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "employees.upload.rows": {
+            "filters": ["sample_upload_rows"],
+        },
     },
 }
 
+if EMPLOYEES_LOG_QUEUE:
+    LOGGING["handlers"]["queue"] = {
+        "class": "logging.handlers.QueueHandler",
+        "handlers": LOGGING["loggers"]["employees"]["handlers"],
+        "respect_handler_level": True,
+    }
+    LOGGING["loggers"]["employees"]["handlers"] = ["queue"]
+
 # DRF settings
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'employees.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'employees.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
+
+# Employees app settings
+EMPLOYEES_BULK_BATCH_SIZE = config('EMPLOYEES_BULK_BATCH_SIZE', default=1000, cast=int)
+EMPLOYEES_UPLOAD_MAX_BYTES = config('EMPLOYEES_UPLOAD_MAX_BYTES', default=200 * 1024 * 1024, cast=int)
+EMPLOYEES_UPLOAD_MAX_ERRORS = config('EMPLOYEES_UPLOAD_MAX_ERRORS', default=1000, cast=int)
+# Uploads go through a staging table and COPY (batched INSERTs outside PostgreSQL)
+EMPLOYEES_IMPORT_STAGING = config('EMPLOYEES_IMPORT_STAGING', default=True, cast=bool)
+EMPLOYEES_IMPORT_WORKERS = config('EMPLOYEES_IMPORT_WORKERS', default=2, cast=int)
+EMPLOYEES_CACHE_ALIAS = 'employees'
+# Token -> user lookups cached per process (employees.authentication). They are dropped on a
+# token, user or employee change through a version in the employees cache; with the per-process
+# LocMemCache other processes keep a revoked token or a deactivated user for up to
+# EMPLOYEES_AUTH_CACHE_TIMEOUT seconds. Use a shared EMPLOYEES_CACHE_BACKEND (Redis, Memcached) in production.
+EMPLOYEES_AUTH_CACHE_SIZE = config('EMPLOYEES_AUTH_CACHE_SIZE', default=10000, cast=int)
+EMPLOYEES_AUTH_CACHE_TIMEOUT = config('EMPLOYEES_AUTH_CACHE_TIMEOUT', default=60, cast=int)
+# Requests slower than this are logged as warnings
+EMPLOYEES_SLOW_REQUEST_MS = config('EMPLOYEES_SLOW_REQUEST_MS', default=500, cast=int)
+# Bearer token of the Prometheus scraper for /metrics; without it only staff users can read the metrics
+EMPLOYEES_METRICS_TOKEN = config('EMPLOYEES_METRICS_TOKEN', default='')
+# N+1 guard (employees.query_guard): "off", "warn" (log) or "raise" (fail the request, used by tests)
+EMPLOYEES_QUERY_GUARD = config('EMPLOYEES_QUERY_GUARD', default='warn' if DEBUG else 'off')
+EMPLOYEES_QUERY_GUARD_MAX_REPEATS = config('EMPLOYEES_QUERY_GUARD_MAX_REPEATS', default=3, cast=int)
+EMPLOYEES_LIST_CACHE_TIMEOUT = config('EMPLOYEES_LIST_CACHE_TIMEOUT', default=300, cast=int)
+EMPLOYEES_FAST_SERIALIZERS = config('EMPLOYEES_FAST_SERIALIZERS', default=False, cast=bool)
+EMPLOYEES_EXPORT_CHUNK_SIZE = config('EMPLOYEES_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+EMPLOYEES_SEARCH_LIMIT = 20
+EMPLOYEES_SEARCH_MAX_LIMIT = 100
+# Managers returned by the headcount stats endpoint, biggest teams first
+EMPLOYEES_STATS_MANAGER_LIMIT = 100
+EMPLOYEES_STATS_MANAGER_MAX_LIMIT = 1000
+# Ids per request to the batch endpoint (/api/v1/employees/batch/)
+EMPLOYEES_BATCH_MAX_IDS = 500
+EMPLOYEES_HIERARCHY_MAX_DEPTH = config('EMPLOYEES_HIERARCHY_MAX_DEPTH', default=50, cast=int)
+# Materialized manager path (Employee.tree_path) for org chart lookups; when switched on
+# for an existing database, run `manage.py rebuild_employee_tree` first
+EMPLOYEES_TREE_INDEX = config('EMPLOYEES_TREE_INDEX', default=True, cast=bool)
@@ -18,8 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.authtoken.views import obtain_auth_token
 
+from employees.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/v1/employees/", include("employees.urls")),
     path("api/v1/auth/token/", obtain_auth_token, name="api-token-auth"),
+    path("metrics", metrics, name="metrics"),
 ]
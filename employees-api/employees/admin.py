@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from employees.models import Location, Employee
+from employees.models import Location, Employee, ImportJob
+from employees.search import filter_by_search
 
 
 @admin.register(Location)
@@ -20,3 +21,24 @@ class EmployeeAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'position', 'specialization', 'location', 'manager')
     search_fields = ('full_name', 'telegram_nick')
     list_filter = ('position', 'specialization', 'location')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Names and "about" go through the search indexes instead of icontains;
+        # "@nick" is matched as a prefix of telegram_nick
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.startswith("@"):
+            return queryset.filter(telegram_nick__startswith=search_term), False
+        return filter_by_search(queryset, search_term), False
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'rows_processed', 'created_count', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'total_bytes', 'bytes_processed', 'rows_processed', 'created_count', 'errors',
+                       'created_at', 'started_at', 'finished_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,130 @@
+from math import ceil
+
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from employees.fast_serializers import DETAIL_FIELDS, LIST_FIELDS, serialize_detail_row, serialize_list_rows
+from employees.filters import EmployeeFilter
+from employees.models import Employee
+from employees.pagination import EmployeeKeysetPagination, EmployeePagination
+from employees.query_guard import query_budget
+from employees.renderers import FastJSONRenderer
+
+# Async versions of the list and detail endpoints for ASGI deployments: plain Django views on
+# the async ORM, no DRF machinery, so a request never leaves the event loop to run a view.
+# The responses are the same as EmployeeListView / EmployeeDetailView return (without the page cache).
+
+# Public filter name -> lookup, as EmployeeFilter applies them
+FILTER_LOOKUPS = {
+    "position": "position",
+    "specialization": "specialization",
+    "location__city": "location_city",
+}
+
+
+def json_response(data, status=200):
+    return HttpResponse(FastJSONRenderer().render(data), content_type="application/json", status=status)
+
+
+async def filter_employees(params):
+    # EmployeeFilter's own form fields validate the values; the manager is checked with the async
+    # ORM, since ModelChoiceField would query the database synchronously
+    fields = EmployeeFilter(params).form.fields
+    filters, errors = {}, {}
+    for name, lookup in FILTER_LOOKUPS.items():
+        value = params.get(name)
+        if not value:
+            continue
+        try:
+            filters[lookup] = fields[name].clean(value)
+        except ValidationError as e:
+            errors[name] = e.messages
+
+    manager = params.get("manager")
+    if manager:
+        try:
+            manager_id = int(manager)
+        except ValueError:
+            manager_id = None
+        if manager_id is None or not await Employee.objects.filter(pk=manager_id).aexists():
+            errors["manager"] = [fields["manager"].error_messages["invalid_choice"]]
+        else:
+            filters["manager_id"] = manager_id
+
+    return Employee.objects.filter(**filters).order_by("full_name", "id"), errors
+
+
+async def get_number_page(request, queryset):
+    paginator = EmployeePagination()
+    page_size = paginator.get_page_size(request)
+    count = await queryset.acount()
+    num_pages = max(ceil(count / page_size), 1)
+
+    page = request.query_params.get(paginator.page_query_param) or 1
+    try:
+        number = num_pages if page in paginator.last_page_strings else int(page)
+    except ValueError:
+        number = 0
+    if not 1 <= number <= num_pages:
+        raise NotFound(PageNumberPagination.invalid_page_message)
+
+    offset = (number - 1) * page_size
+    rows = [row async for row in queryset.values(*LIST_FIELDS)[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, paginator.page_query_param, number + 1) if number < num_pages else None
+    if number == 1:
+        previous_link = None
+    elif number == 2:
+        previous_link = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous_link = replace_query_param(url, paginator.page_query_param, number - 1)
+    return {"count": count, "next": next_link, "previous": previous_link, "results": serialize_list_rows(rows)}
+
+
+async def get_keyset_page(request, queryset):
+    paginator = EmployeeKeysetPagination()
+    paginator.request = request
+    paginator.page_size = paginator.get_page_size(request)
+    count = await queryset.acount() if paginator.get_include_count(request) else None
+
+    queryset = paginator.filter_after(queryset.values(*LIST_FIELDS), paginator.decode_cursor(request))
+    rows = paginator.cut_page([row async for row in queryset[:paginator.page_size + 1]])
+
+    payload = {} if count is None else {"count": count}
+    payload["next"] = paginator.get_next_link()
+    payload["results"] = serialize_list_rows(rows)
+    return payload
+
+
+@query_budget(3)
+@require_GET
+async def employee_list(request):
+    # The DRF request wrapper is only used for its query_params; it does no I/O
+    request = Request(request)
+    queryset, errors = await filter_employees(request.query_params)
+    if errors:
+        return json_response(errors, status=400)
+
+    try:
+        if EmployeeKeysetPagination.cursor_query_param in request.query_params:
+            return json_response(await get_keyset_page(request, queryset))
+        return json_response(await get_number_page(request, queryset))
+    except NotFound as e:
+        return json_response({"detail": e.detail}, status=404)
+
+
+@query_budget(1)
+@require_GET
+async def employee_detail(request, pk):
+    try:
+        row = await Employee.objects.values(*DETAIL_FIELDS).aget(pk=pk)
+    except Employee.DoesNotExist:
+        # Same message as get_object_or_404 in EmployeeDetailView
+        return json_response({"detail": f"No {Employee._meta.object_name} matches the given query."}, status=404)
+    return json_response(serialize_detail_row(row))
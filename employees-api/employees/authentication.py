@@ -0,0 +1,84 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from employees.cache import bump_version, get_version
+
+# TokenAuthentication with the token -> (user, employee) lookup kept in a bounded LRU of this
+# process, so a repeated token costs no queries. Entries expire after EMPLOYEES_AUTH_CACHE_TIMEOUT
+# seconds and are all dropped when the shared version changes: it is bumped when a token is
+# deleted or a user or their employee is saved (see signals.py). The version lives in the
+# employees cache: with the default LocMemCache every process has its own, so a change made
+# in one process reaches the others only when their entries expire.
+
+VERSION_KEY = "employees:auth:version"
+
+
+def invalidate_cached_tokens():
+    transaction.on_commit(lambda: bump_version(VERSION_KEY))
+
+
+class TokenCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = OrderedDict()
+
+    def get(self, key, version):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1:]
+
+    def set(self, key, version, token, user, employee):
+        # Stored only if nothing was invalidated since `version` was read, before the token was queried
+        with self.lock:
+            if version != self.version:
+                return
+            expires_at = time.monotonic() + settings.EMPLOYEES_AUTH_CACHE_TIMEOUT
+            self.entries[key] = (expires_at, token, user, employee)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.EMPLOYEES_AUTH_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        version = get_version(VERSION_KEY)
+        cached = token_cache.get(key, version)
+        if cached is None:
+            try:
+                token = Token.objects.select_related("user", "user__employee").get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            cached = (token, token.user, getattr(token.user, "employee", None))
+            token_cache.set(key, version, *cached)
+
+        token, user, employee = cached
+        # Every request gets its own copies: views may change them (the importer refreshes the manager)
+        user = copy.copy(user)
+        User.employee.related.set_cached_value(user, copy.copy(employee))
+        return user, token
@@ -0,0 +1,95 @@
+import json
+import math
+import time
+import tracemalloc
+
+from django.core.management import call_command
+from django.db import connection
+
+from employees.models import Employee
+
+
+def percentile(ordered, pct):
+    # Nearest-rank percentile over an already sorted list
+    if not ordered:
+        return None
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(timings_ms):
+    ordered = sorted(timings_ms)
+    return {
+        "count": len(ordered),
+        "min_ms": round(ordered[0], 3) if ordered else None,
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else None,
+        "p50_ms": round(percentile(ordered, 50), 3) if ordered else None,
+        "p95_ms": round(percentile(ordered, 95), 3) if ordered else None,
+        "p99_ms": round(percentile(ordered, 99), 3) if ordered else None,
+        "max_ms": round(ordered[-1], 3) if ordered else None,
+    }
+
+
+def measure(func, repeat=50, warmup=3):
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def ensure_employees(count, stdout=None):
+    # Tops the table up to `count` rows with populate_employees
+    existing = Employee.objects.count()
+    if existing < count:
+        call_command("populate_employees", count=count - existing, stdout=stdout)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE employees_employee")
+    return max(existing, count)
+
+
+def explain(queryset):
+    if connection.vendor == "postgresql":
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
+
+
+def write_results(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+
+
+def peak_memory_kb(func):
+    # Separate untimed run: tracemalloc slows everything down
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def read_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_regressions(baseline, results, max_slowdown_pct):
+    # Scenarios whose p50 got slower by more than max_slowdown_pct, or that run more queries
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p50_ms"] and current["p50_ms"] > previous["p50_ms"] * (1 + max_slowdown_pct / 100):
+            regressions.append(f"{name}: p50 {previous['p50_ms']} -> {current['p50_ms']} ms")
+        if current["queries_per_request"] > previous["queries_per_request"]:
+            regressions.append(
+                f"{name}: запросов {previous['queries_per_request']} -> {current['queries_per_request']}"
+            )
+    return regressions
@@ -0,0 +1,87 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+GENERATION_KEY = "employees:generation"
+HITS_KEY = "employees:list:hits"
+MISSES_KEY = "employees:list:misses"
+
+
+def get_cache():
+    return caches[settings.EMPLOYEES_CACHE_ALIAS]
+
+
+def get_version(key):
+    # A shared counter in the employees cache: whatever is keyed by (or checked against)
+    # its value is invalidated at once by bump_version(), without knowing the dependent keys
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # A fresh value (not 1), so anything built before an eviction can never match again
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_generation():
+    # Every cached list page is keyed by the current generation
+    return get_version(GENERATION_KEY)
+
+
+def bump_generation():
+    bump_version(GENERATION_KEY)
+
+
+def invalidate_employee_lists():
+    # Runs after commit: until then other requests still see (and may cache) the old rows
+    transaction.on_commit(bump_generation)
+
+
+def list_cache_key(request):
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    raw = f"{request.scheme}://{request.get_host()}{request.path}?{params}"
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return f"employees:list:{get_generation()}:page:{digest}"
+
+
+def get_list_page(key):
+    return get_cache().get(key)
+
+
+def set_list_page(key, page):
+    # page is (etag, content). The key must be computed before the page is queried: if the
+    # generation is bumped meanwhile, the page lands under the old generation and is never served
+    get_cache().set(key, page, timeout=settings.EMPLOYEES_LIST_CACHE_TIMEOUT)
+
+
+def record_lookup(hit):
+    cache = get_cache()
+    key = HITS_KEY if hit else MISSES_KEY
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 4) if total else None,
+    }
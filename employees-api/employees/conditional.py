@@ -0,0 +1,42 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+# Conditional GET for the employee list and detail. The ETag is derived from the data version
+# (updated_at), not from the response body, so a matching If-None-Match is answered with
+# 304 before anything is serialized.
+
+
+def version(updated_at):
+    return int(updated_at.timestamp() * 1_000_000) if updated_at else 0
+
+
+def detail_etag(request, pk, updated_at):
+    return quote_etag(f"{request.accepted_renderer.format}-{pk}-{version(updated_at)}")
+
+
+def list_etag(request, queryset):
+    # Version of one filter set: the newest row and the row count (a deleted row changes only the count).
+    # The page parameters are part of the tag, as they are of the URL.
+    state = queryset.aggregate(updated_at=Max("updated_at"), count=Count("id"))
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+    raw = f"{request.accepted_renderer.format}:{request.path}?{params}:{state['count']}:{version(state['updated_at'])}"
+    return quote_etag(hashlib.md5(raw.encode("utf-8")).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    # 304 (or 412 for a failed If-Match) if the client's copy is current, otherwise None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
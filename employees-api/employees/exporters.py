@@ -0,0 +1,61 @@
+import csv
+import json
+
+from django.conf import settings
+
+from employees.bulk import copy_to, supports_copy
+
+# The directory is exported with the columns BulkEmployeeUploadView accepts,
+# so an exported file can be uploaded back as is.
+EXPORT_COLUMNS = ("full_name", "position", "specialization", "city", "country", "telegram_nick", "about")
+EXPORT_FIELDS = (
+    "full_name", "position", "specialization", "location__city", "location__country", "telegram_nick", "about",
+)
+
+
+def export_rows(queryset):
+    return queryset.values_list(*EXPORT_FIELDS)
+
+
+def export_csv(queryset, file):
+    # Writes the employees to a text file: COPY TO on PostgreSQL, a server-side cursor elsewhere
+    csv.writer(file).writerow(EXPORT_COLUMNS)
+    rows = export_rows(queryset)
+    if supports_copy():
+        copy_to(rows, file)
+    else:
+        csv.writer(file).writerows(rows.iterator(chunk_size=settings.EMPLOYEES_BULK_BATCH_SIZE))
+
+
+class LineBuffer:
+    # csv.writer target that just hands the formatted line back
+    def write(self, line):
+        return line
+
+
+def stream_chunks(rows, format_row, header=None):
+    # Yields the export in pieces of EMPLOYEES_EXPORT_CHUNK_SIZE rows. The header goes out
+    # before the query runs, so the first byte arrives immediately.
+    chunk_size = settings.EMPLOYEES_EXPORT_CHUNK_SIZE
+    if header is not None:
+        yield header
+    lines = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        lines.append(format_row(row))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def stream_csv(queryset):
+    writer = csv.writer(LineBuffer())
+    return stream_chunks(export_rows(queryset), writer.writerow, header=writer.writerow(EXPORT_COLUMNS))
+
+
+def stream_ndjson(queryset):
+    def format_row(row):
+        return json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n"
+
+    return stream_chunks(export_rows(queryset), format_row)
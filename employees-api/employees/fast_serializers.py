@@ -0,0 +1,55 @@
+# Plain-dict serializers for the list and detail endpoints: rows come straight from
+# .values() and skip the DRF field machinery, the output is the same as
+# EmployeeListSerializer / EmployeeDetailSerializer produce.
+
+LIST_FIELDS = (
+    "id",
+    "full_name",
+    "position",
+    "specialization",
+    "location_city",
+    "manager_short_name",
+)
+
+DETAIL_FIELDS = (
+    "id",
+    "full_name",
+    "position",
+    "specialization",
+    "manager_id",
+    "manager__full_name",
+    "location_label",
+    "telegram_nick",
+    "about",
+)
+
+
+def serialize_list_rows(rows):
+    return [
+        {
+            "id": row["id"],
+            "full_name": row["full_name"],
+            "position": row["position"],
+            "specialization": row["specialization"],
+            "city": row["location_city"],
+            "manager_name": row["manager_short_name"],
+        }
+        for row in rows
+    ]
+
+
+def serialize_detail_row(row):
+    data = {
+        "id": row["id"],
+        "full_name": row["full_name"],
+        "position": row["position"],
+        "specialization": row["specialization"],
+    }
+    # EmployeeDetailSerializer skips manager_id / manager_full_name entirely for employees without a manager
+    if row["manager_id"] is not None:
+        data["manager_id"] = row["manager_id"]
+        data["manager_full_name"] = row["manager__full_name"]
+    data["location_full"] = row["location_label"]
+    data["telegram_nick"] = row["telegram_nick"]
+    data["about"] = row["about"]
+    return data
@@ -0,0 +1,13 @@
+import django_filters
+
+from employees.models import Employee
+
+
+class EmployeeFilter(django_filters.FilterSet):
+    # The city filter keeps its public name but reads the denormalized column, so filtered
+    # lists are served from the employees table alone
+    location__city = django_filters.CharFilter(field_name="location_city")
+
+    class Meta:
+        model = Employee
+        fields = ["position", "specialization", "location__city", "manager"]
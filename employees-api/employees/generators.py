@@ -0,0 +1,110 @@
+import random
+from array import array
+
+from faker import Faker
+
+from employees.models import Position, Specialization, short_name
+
+# Columns of the rows produced by EmployeeGenerator, as Employee attribute names
+COLUMNS = (
+    "id", "full_name", "position", "specialization", "location_id", "telegram_nick", "about",
+    "manager_id", "manager_short_name", "location_city", "location_label", "tree_path", "tree_depth",
+)
+
+
+class EmployeeGenerator:
+    # Generates random employees for populate_employees chunk by chunk. Faker only fills
+    # a small pool of people up front; rows are drawn from the pool with a seeded RNG,
+    # so the same seed always produces the same data.
+    #
+    # The org chart is a forest: the first `roots` employees have no manager, then
+    # every employee gets `fanout` direct reports, level after level.
+
+    def __init__(self, locations, roots=5, fanout=5, seed=None, pool_size=10_000):
+        self.rng = random.Random(seed)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        locations = [
+            (location.id, location.city, f"{location.city}, {location.country}") for location in locations
+        ]
+        # A row is a random pool entry plus its own id, manager and tree position:
+        # one random draw per row instead of one per field
+        self.pool = []
+        for _ in range(pool_size):
+            full_name = fake.name()
+            location_id, city, label = self.rng.choice(locations)
+            self.pool.append((
+                full_name,
+                short_name(full_name),
+                self.rng.choice(Position.values),
+                self.rng.choice(Specialization.values),
+                location_id,
+                f"@{fake.user_name()}",
+                fake.sentence(nb_words=10),
+                city,
+                label,
+            ))
+        self.roots = roots
+        self.fanout = fanout
+        # Per generated employee only the id and the pool index are kept (12 bytes),
+        # that is all their reports need
+        self.ids = array("q")
+        self.pool_indexes = array("l")
+
+    @property
+    def generated(self):
+        return len(self.ids)
+
+    def manager_index(self, index):
+        if index < self.roots:
+            return None
+        return (index - self.roots) // self.fanout
+
+    def next_chunk_size(self, limit):
+        # A chunk must not contain the managers of its own rows: they have to be
+        # written (and have ids) before their reports
+        start = self.generated
+        if start < self.roots:
+            return min(limit, self.roots - start)
+        return min(limit, start * self.fanout + self.roots - start)
+
+    def tree_position(self, index):
+        # Path and depth of a report of the employee at `index`
+        chain = []
+        while index is not None:
+            chain.append(self.ids[index])
+            index = self.manager_index(index)
+        return "/" + "".join(f"{pk}/" for pk in reversed(chain)), len(chain)
+
+    def build_rows(self, ids):
+        start = self.generated
+        pool = self.pool
+        pool_indexes = self.rng.choices(range(len(pool)), k=len(ids))
+        self.ids.extend(ids)
+        self.pool_indexes.extend(pool_indexes)
+
+        rows = []
+        last_manager = -1
+        manager_id = manager_short_name = None
+        tree_path, tree_depth = "/", 0
+        for offset, pk in enumerate(ids):
+            manager = self.manager_index(start + offset)
+            # Siblings come one after another, so the manager's data is only looked up once per family
+            if manager != last_manager:
+                last_manager = manager
+                if manager is None:
+                    manager_id = manager_short_name = None
+                    tree_path, tree_depth = "/", 0
+                else:
+                    manager_id = self.ids[manager]
+                    manager_short_name = pool[self.pool_indexes[manager]][1]
+                    tree_path, tree_depth = self.tree_position(manager)
+
+            full_name, _, position, specialization, location_id, nick, about, city, label = pool[pool_indexes[offset]]
+            rows.append((
+                pk, full_name, position, specialization, location_id,
+                # The id keeps nicks unique
+                f"{nick}{pk}",
+                about, manager_id, manager_short_name, city, label, tree_path, tree_depth,
+            ))
+        return rows
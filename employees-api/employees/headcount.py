@@ -0,0 +1,172 @@
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from employees.models import Employee, HeadcountCounter, HeadcountDimension
+
+# Headcount by position, specialization, city and direct manager, kept in HeadcountCounter
+# rows. Every write adds its delta to the counters in the same transaction, so the stats
+# endpoint reads a few rows per group instead of running GROUP BY over all employees.
+
+# Employee column each dimension is grouped by
+DIMENSION_FIELDS = {
+    HeadcountDimension.POSITION: "position",
+    HeadcountDimension.SPECIALIZATION: "specialization",
+    HeadcountDimension.CITY: "location_city",
+    HeadcountDimension.MANAGER: "manager_id",
+}
+GROUP_FIELDS = tuple(DIMENSION_FIELDS.values())
+# Three parameters per row, within the SQLite limit of 999
+BATCH_SIZE = 300
+
+
+def to_value(value):
+    # Counter values are strings; employees without a manager are counted under ""
+    return "" if value is None else str(value)
+
+
+def employee_groups(employee):
+    return tuple(getattr(employee, field) for field in GROUP_FIELDS)
+
+
+def loaded_groups(employee):
+    # Groups of the row as it is in the database: from the values it was loaded with,
+    # or queried if some of them were not loaded (e.g. .only())
+    loaded = getattr(employee, "_loaded_values", {})
+    if all(field in loaded for field in GROUP_FIELDS):
+        return tuple(loaded[field] for field in GROUP_FIELDS)
+    return Employee.objects.filter(pk=employee.pk).values_list(*GROUP_FIELDS).first()
+
+
+def count_employee(deltas, groups, count=1):
+    for dimension, value in zip(DIMENSION_FIELDS, groups):
+        deltas[dimension, to_value(value)] += count
+
+
+def apply_deltas(deltas):
+    rows = sorted((dimension, value, delta) for (dimension, value), delta in deltas.items() if delta)
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(HeadcountCounter._meta.db_table)
+    count = quote("count")
+    # Sorted, so concurrent writers lock the shared counter rows in the same order and cannot deadlock
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (dimension, value, {count})
+                VALUES {", ".join(["(%s, %s, %s)"] * len(batch))}
+                ON CONFLICT (dimension, value) DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}
+                """,
+                [item for row in batch for item in row],
+            )
+
+
+def record_change(before, after):
+    # before/after are employee_groups() tuples, None for a created or deleted employee
+    if before == after:
+        return
+    deltas = Counter()
+    if before:
+        count_employee(deltas, before, -1)
+    if after:
+        count_employee(deltas, after)
+    apply_deltas(deltas)
+
+
+def record_delete(employee):
+    # pre_delete: the groups are read from the row, not the instance, and the subordinates
+    # are only remembered. When a manager and some of their subordinates are deleted in one
+    # queryset, those subordinates are subtracted under the manager here and must not be
+    # moved to "no manager" as well.
+    groups = Employee.objects.filter(pk=employee.pk).values_list(*GROUP_FIELDS).first()
+    if groups is None:
+        return
+    deltas = Counter()
+    count_employee(deltas, groups, -1)
+    apply_deltas(deltas)
+    employee._headcount_subordinates = list(Employee.objects.filter(manager_id=employee.pk).values_list("id", flat=True))
+
+
+def record_detached_subordinates(employee):
+    # post_delete: on_delete=SET_NULL has moved the surviving subordinates to "no manager" without save()
+    ids = employee.__dict__.pop("_headcount_subordinates", [])
+    moved = sum(
+        Employee.objects.filter(pk__in=ids[start:start + BATCH_SIZE]).count() for start in range(0, len(ids), BATCH_SIZE)
+    )
+    deltas = Counter()
+    deltas[HeadcountDimension.MANAGER, to_value(employee.pk)] -= moved
+    deltas[HeadcountDimension.MANAGER, to_value(None)] += moved
+    apply_deltas(deltas)
+
+
+def record_city_rename(old_city, new_city, count):
+    deltas = Counter()
+    deltas[HeadcountDimension.CITY, old_city] -= count
+    deltas[HeadcountDimension.CITY, new_city] += count
+    apply_deltas(deltas)
+
+
+def recount():
+    actual = Counter()
+    for dimension, field in DIMENSION_FIELDS.items():
+        for value, count in Employee.objects.values_list(field).annotate(count=Count("id")).order_by():
+            actual[dimension, to_value(value)] = count
+    return actual
+
+
+def reconcile(fix=True):
+    # Recounts every group from scratch and returns the drift as (dimension, value, stored, actual).
+    # The counter rows are locked first: writers that commit meanwhile wait for the new values
+    # and then add their deltas on top of them.
+    with transaction.atomic():
+        counters = {(counter.dimension, counter.value): counter for counter in HeadcountCounter.objects.select_for_update()}
+        actual = recount()
+        drift = []
+        for key in sorted(counters.keys() | actual.keys()):
+            stored = counters[key].count if key in counters else 0
+            if stored != actual[key]:
+                drift.append((*key, stored, actual[key]))
+
+        if fix:
+            changed, created = [], []
+            for dimension, value, stored, count in drift:
+                counter = counters.get((dimension, value))
+                if counter is None:
+                    created.append(HeadcountCounter(dimension=dimension, value=value, count=count))
+                elif count:
+                    counter.count = count
+                    changed.append(counter)
+            HeadcountCounter.objects.bulk_update(changed, ["count"], batch_size=BATCH_SIZE)
+            HeadcountCounter.objects.bulk_create(created, batch_size=BATCH_SIZE)
+            # Groups without employees (e.g. a deleted manager) are dropped
+            HeadcountCounter.objects.filter(pk__in=[
+                counter.pk for key, counter in counters.items() if not actual[key]
+            ]).delete()
+    return drift
+
+
+def get_headcount_stats(manager_limit):
+    # Position, specialization and city have a handful of groups each; managers can have
+    # thousands, so only the biggest `manager_limit` of them are returned
+    counters = HeadcountCounter.objects.filter(count__gt=0).order_by("dimension", "-count", "value")
+    groups = defaultdict(list)
+    for dimension, value, count in counters.exclude(dimension=HeadcountDimension.MANAGER).values_list(
+        "dimension", "value", "count"
+    ):
+        groups[dimension].append({"value": value, "count": count})
+
+    managers = counters.filter(dimension=HeadcountDimension.MANAGER).values_list("value", "count")[:manager_limit]
+    managers = [(int(value) if value else None, count) for value, count in managers]
+    names = dict(Employee.objects.filter(pk__in=[pk for pk, _ in managers if pk]).values_list("id", "full_name"))
+
+    return {
+        "total": sum(group["count"] for group in groups[HeadcountDimension.POSITION]),
+        "position": groups[HeadcountDimension.POSITION],
+        "specialization": groups[HeadcountDimension.SPECIALIZATION],
+        "city": groups[HeadcountDimension.CITY],
+        "manager": [{"id": pk, "full_name": names.get(pk), "count": count} for pk, count in managers],
+    }
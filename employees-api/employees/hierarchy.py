@@ -0,0 +1,185 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, Count, F, Q, Value
+from django.db.models.functions import Cast, Concat, StrIndex, Substr
+
+from employees.models import Employee
+
+# Org chart queries over Employee.manager. Each one is a single recursive CTE,
+# so walking a whole subtree costs one round trip instead of one query per level.
+# With EMPLOYEES_TREE_INDEX the materialized Employee.tree_path is used instead,
+# and the same questions become prefix lookups on an index.
+
+TABLE = Employee._meta.db_table
+
+ROW_FIELDS = ("id", "full_name", "position", "specialization", "location_city", "manager_id", "manager_short_name")
+ROW_COLUMNS = "e.id, e.full_name, e.position, e.specialization, e.location_city, e.manager_id, e.manager_short_name"
+
+SUBTREE_SQL = f"""
+WITH RECURSIVE subtree (id, depth) AS (
+    SELECT id, 0 FROM {TABLE} WHERE id = %s
+    UNION ALL
+    SELECT child.id, subtree.depth + 1
+    FROM {TABLE} child
+    JOIN subtree ON child.manager_id = subtree.id
+    WHERE subtree.depth < %s
+)
+SELECT {ROW_COLUMNS}, subtree.depth
+FROM subtree
+JOIN {TABLE} e ON e.id = subtree.id
+ORDER BY subtree.depth, e.full_name, e.id
+"""
+
+ANCESTORS_SQL = f"""
+WITH RECURSIVE chain (id, manager_id, depth) AS (
+    SELECT id, manager_id, 0 FROM {TABLE} WHERE id = %s
+    UNION ALL
+    SELECT parent.id, parent.manager_id, chain.depth + 1
+    FROM {TABLE} parent
+    JOIN chain ON parent.id = chain.manager_id
+    WHERE chain.depth < %s
+)
+SELECT {ROW_COLUMNS}, chain.depth
+FROM chain
+JOIN {TABLE} e ON e.id = chain.id
+ORDER BY chain.depth
+"""
+
+HEADCOUNT_SQL = f"""
+WITH RECURSIVE subtree (id, branch_id, depth) AS (
+    SELECT id, id, 1 FROM {TABLE} WHERE manager_id = %s
+    UNION ALL
+    SELECT child.id, subtree.branch_id, subtree.depth + 1
+    FROM {TABLE} child
+    JOIN subtree ON child.manager_id = subtree.id
+    WHERE subtree.depth < %s
+)
+SELECT branch.id, branch.full_name, COUNT(*)
+FROM subtree
+JOIN {TABLE} branch ON branch.id = subtree.branch_id
+GROUP BY branch.id, branch.full_name
+ORDER BY branch.full_name, branch.id
+"""
+
+# UNION rather than UNION ALL: a cycle left in the data ends the walk instead of looping forever
+IS_SUBORDINATE_SQL = f"""
+WITH RECURSIVE chain (id) AS (
+    SELECT manager_id FROM {TABLE} WHERE id = %s
+    UNION
+    SELECT parent.manager_id
+    FROM {TABLE} parent
+    JOIN chain ON parent.id = chain.id
+)
+SELECT 1 FROM chain WHERE id = %s
+"""
+
+
+def to_dict(row):
+    return {
+        "id": row[0],
+        "full_name": row[1],
+        "position": row[2],
+        "specialization": row[3],
+        "city": row[4],
+        "manager_id": row[5],
+        "manager_name": row[6],
+        "depth": row[7],
+    }
+
+
+def fetch(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def get_tree_position(pk):
+    return Employee.objects.filter(pk=pk).values_list("tree_path", "tree_depth").first()
+
+
+def get_subtree_by_path(pk, max_depth):
+    position = get_tree_position(pk)
+    if position is None:
+        return []
+    path, depth = position
+    queryset = (
+        Employee.objects.filter(
+            Q(pk=pk) | Q(tree_path__startswith=f"{path}{pk}/", tree_depth__lte=depth + max_depth)
+        )
+        .annotate(depth=F("tree_depth") - depth)
+        .order_by("depth", "full_name", "id")
+        .values_list(*ROW_FIELDS, "depth")
+    )
+    return [to_dict(row) for row in queryset]
+
+
+def get_ancestors_by_path(pk, max_depth):
+    position = get_tree_position(pk)
+    if position is None:
+        return []
+    path, _ = position
+    ids = [int(part) for part in path.strip("/").split("/") if part]
+    ids = ids[max(len(ids) - max_depth, 0):]
+    depths = {ancestor_id: len(ids) - index for index, ancestor_id in enumerate(ids)}
+    depths[pk] = 0
+    rows = Employee.objects.filter(pk__in=depths).values_list(*ROW_FIELDS)
+    return sorted((to_dict((*row, depths[row[0]])) for row in rows), key=lambda row: row["depth"])
+
+
+def get_headcount_by_path(pk, max_depth):
+    position = get_tree_position(pk)
+    if position is None:
+        return []
+    path, depth = position
+    prefix = f"{path}{pk}/"
+    # The branch of a descendant is the first id after the prefix in its own full path
+    rest = Substr(Concat("tree_path", Cast("id", CharField()), Value("/")), len(prefix) + 1)
+    counts = dict(
+        Employee.objects.filter(tree_path__startswith=prefix, tree_depth__lte=depth + max_depth)
+        .annotate(branch=Substr(rest, 1, StrIndex(rest, Value("/")) - 1))
+        .values("branch")
+        .annotate(headcount=Count("id"))
+        .order_by()
+        .values_list("branch", "headcount")
+    )
+    branches = Employee.objects.filter(manager_id=pk).order_by("full_name", "id").values_list("id", "full_name")
+    return [
+        {"id": branch_id, "full_name": full_name, "headcount": counts[str(branch_id)]}
+        for branch_id, full_name in branches
+        if str(branch_id) in counts
+    ]
+
+
+def get_subtree(pk, max_depth):
+    # The employee itself (depth 0) followed by everyone under them, level by level
+    if settings.EMPLOYEES_TREE_INDEX:
+        return get_subtree_by_path(pk, max_depth)
+    return [to_dict(row) for row in fetch(SUBTREE_SQL, [pk, max_depth])]
+
+
+def get_ancestors(pk, max_depth):
+    # The employee itself (depth 0) followed by their manager, the manager's manager and so on up to the root
+    if settings.EMPLOYEES_TREE_INDEX:
+        return get_ancestors_by_path(pk, max_depth)
+    return [to_dict(row) for row in fetch(ANCESTORS_SQL, [pk, max_depth])]
+
+
+def get_headcount(pk, max_depth):
+    # Headcount of every branch under the employee, one branch per direct report.
+    # The direct reports are at depth 1, so with max_depth 0 there is nothing to count.
+    if max_depth < 1:
+        return []
+    if settings.EMPLOYEES_TREE_INDEX:
+        return get_headcount_by_path(pk, max_depth)
+    return [
+        {"id": branch_id, "full_name": full_name, "headcount": headcount}
+        for branch_id, full_name, headcount in fetch(HEADCOUNT_SQL, [pk, max_depth])
+    ]
+
+
+def is_subordinate(pk, manager_pk):
+    # Whether the employee is somewhere under manager_pk, at any depth
+    if settings.EMPLOYEES_TREE_INDEX:
+        return Employee.objects.filter(pk=pk, tree_path__contains=f"/{manager_pk}/").exists()
+    # The whole chain up to the root, not only EMPLOYEES_HIERARCHY_MAX_DEPTH levels of it
+    return bool(fetch(IS_SUBORDINATE_SQL, [pk, manager_pk]))
@@ -0,0 +1,558 @@
+import codecs
+import csv
+import logging
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from employees.authentication import invalidate_cached_tokens
+from employees.bulk import write_rows
+from employees.cache import invalidate_employee_lists
+from employees.headcount import apply_deltas, count_employee, employee_groups
+from employees.models import TREE_FIELDS, Employee, Location, short_name
+from employees.references import get_locations
+from employees.serializers import EmployeeCreateSerializer
+
+logger = logging.getLogger("employees")
+# Per-row messages go to a child logger, so they can be sampled on their own
+row_logger = logging.getLogger("employees.upload.rows")
+
+
+class EmployeeImportProgress:
+    def __init__(self, total_bytes=None):
+        self.total_bytes = total_bytes
+        self.bytes_processed = 0
+        self.rows_processed = 0
+
+
+class EmployeeImportResult:
+    # Only counts: the ids of a big upload would grow with the file
+    def __init__(self):
+        self.created_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+        self.errors = []
+
+    def clear(self):
+        self.created_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+
+
+def read_csv_rows(file, progress):
+    # Decodes the upload line by line, so only the current line is held in memory
+    # no matter how big the file is. utf-8-sig also strips the BOM added by Excel.
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def lines():
+        for line in file:
+            progress.bytes_processed += len(line)
+            yield decoder.decode(line)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    return csv.DictReader(lines())
+
+
+# Columns an upsert compares and overwrites; the manager and the tree position of an
+# existing employee are left as they are
+UPSERT_FIELDS = ("full_name", "position", "specialization", "location_id", "about")
+# Nicks of an upsert seen so far, with their lines
+NICKS_TABLE = "employees_import_nicks"
+
+
+def refresh_subordinate_short_names(renamed):
+    # Employee.save() does this for one renamed employee; here one UPDATE covers a batch of (id, full_name)
+    for start in range(0, len(renamed), 1000):
+        batch = renamed[start:start + 1000]
+        Employee.objects.filter(manager_id__in=[pk for pk, _ in batch]).update(
+            manager_short_name=Case(
+                *(When(manager_id=pk, then=Value(short_name(full_name))) for pk, full_name in batch)
+            ),
+            updated_at=timezone.now(),
+        )
+
+
+class EmployeeBulkImporter:
+    # Validates rows with the EmployeeCreateSerializer rules and writes them with bulk_create
+    # chunk by chunk inside one transaction, so one bad line leaves the database untouched.
+    # With upsert=True rows are matched to existing employees by telegram_nick: changed ones
+    # are updated with one bulk_update per chunk, unchanged ones are only counted.
+
+    def __init__(self, manager=None, batch_size=None, max_errors=None, progress=None, on_progress=None,
+                 upsert=False):
+        self.manager = manager
+        self.upsert = upsert
+        # nick -> line of the current chunk only; earlier chunks are checked in the database
+        self.nick_lines = {}
+        if manager is not None and settings.EMPLOYEES_TREE_INDEX:
+            # The tree position of every new row is derived from the manager's
+            manager.refresh_from_db(fields=TREE_FIELDS)
+        self.batch_size = batch_size or settings.EMPLOYEES_BULK_BATCH_SIZE
+        self.max_errors = max_errors or settings.EMPLOYEES_UPLOAD_MAX_ERRORS
+        self.progress = progress or EmployeeImportProgress()
+        self.on_progress = on_progress
+        # One serializer instance is reused for every row: building the field set
+        # per row costs more than the validation itself.
+        self.serializer = EmployeeCreateSerializer()
+        self.locations = get_locations()
+        # Headcount changes, written to the counters once at the end of the upload
+        self.headcount = Counter()
+
+    def check_natural_key(self, index, nick):
+        if not nick:
+            raise serializers.ValidationError({
+                "telegram_nick": "В режиме обновления ник обязателен: по нему ищется сотрудник."
+            })
+        if nick in self.nick_lines:
+            raise self.repeated_nick_error(nick, self.nick_lines[nick])
+        self.nick_lines[nick] = index
+
+    def validate_row(self, index, row):
+        validated_data = self.serializer.run_validation(row)
+        if self.upsert:
+            self.check_natural_key(index, validated_data.get("telegram_nick"))
+
+        city = validated_data.pop("city")
+        country = validated_data.pop("country")
+        location = self.locations.get((city, country))
+        if location is None:
+            raise serializers.ValidationError({
+                "location": f"Локация '{city}, {country}' не найдена в системе."
+            })
+
+        employee = Employee(location=location, manager=self.manager, **validated_data)
+        # bulk_create skips save(), so the denormalized copies are filled in here
+        employee.refresh_denormalized_fields()
+        if settings.EMPLOYEES_TREE_INDEX:
+            employee.refresh_tree_position()
+        return employee
+
+    def validate_chunk(self, chunk, result):
+        self.nick_lines = {}
+        employees = []
+        for index, row in chunk:
+            try:
+                employees.append(self.validate_row(index, row))
+            except serializers.ValidationError as e:
+                self.add_row_error(index, e, result)
+        if self.upsert:
+            self.check_repeated_nicks(result)
+        return employees
+
+    def add_row_error(self, index, error, result):
+        logger.warning("[UPLOAD] Ошибка в строке %s: %s", index, error.detail)
+        result.errors.append({"line": index, "errors": error.detail})
+
+    def repeated_nick_error(self, nick, first_line):
+        return serializers.ValidationError({"telegram_nick": f"Ник {nick} уже встречался в строке {first_line}."})
+
+    def check_repeated_nicks(self, result):
+        # Nicks of the chunk that appeared in earlier chunks. The nicks seen so far are kept in a
+        # temporary table rather than in memory, so a big file costs one lookup per chunk.
+        quote = connection.ops.quote_name
+        table = quote(NICKS_TABLE)
+        with connection.cursor() as cursor:
+            nicks = list(self.nick_lines)
+            for start in range(0, len(nicks), 500):
+                batch = nicks[start:start + 500]
+                cursor.execute(
+                    f"SELECT nick, line FROM {table} WHERE nick IN ({', '.join(['%s'] * len(batch))})", batch
+                )
+                for nick, first_line in cursor.fetchall():
+                    self.add_row_error(self.nick_lines.pop(nick), self.repeated_nick_error(nick, first_line), result)
+        write_rows(NICKS_TABLE, ("nick", "line"), list(self.nick_lines.items()))
+
+    def add_nick_error(self, nick, line, result):
+        error = serializers.ValidationError({
+            "telegram_nick": f"Ник {nick} есть у нескольких сотрудников, обновить по нему нельзя."
+        })
+        self.add_row_error(line, error, result)
+
+    def update_existing(self, employees, result):
+        # Updates the employees of the chunk that already exist and returns the new ones
+        by_nick = {employee.telegram_nick: employee for employee in employees}
+        existing = {}
+        for current in Employee.objects.filter(telegram_nick__in=by_nick).only(
+            "id", "telegram_nick", "location_city", "manager", *(name.removesuffix("_id") for name in UPSERT_FIELDS)
+        ):
+            if current.telegram_nick in existing:
+                self.add_nick_error(current.telegram_nick, self.nick_lines[current.telegram_nick], result)
+            existing[current.telegram_nick] = current
+        if result.errors:
+            return []
+
+        new, changed, renamed = [], [], []
+        now = timezone.now()
+        for nick, employee in by_nick.items():
+            current = existing.get(nick)
+            if current is None:
+                new.append(employee)
+                continue
+            if all(getattr(current, name) == getattr(employee, name) for name in UPSERT_FIELDS):
+                result.unchanged_count += 1
+                continue
+            if current.full_name != employee.full_name:
+                renamed.append((current.pk, employee.full_name))
+            count_employee(self.headcount, employee_groups(current), -1)
+            for name in UPSERT_FIELDS:
+                setattr(current, name, getattr(employee, name))
+            current.location = employee.location
+            current.refresh_location_label()
+            count_employee(self.headcount, employee_groups(current))
+            # bulk_update skips auto_now
+            current.updated_at = now
+            changed.append(current)
+
+        if changed:
+            Employee.objects.bulk_update(changed, [
+                "full_name", "position", "specialization", "location", "about", "location_city", "location_label",
+                "updated_at",
+            ])
+            refresh_subordinate_short_names(renamed)
+            # An employee is part of its user's cached authentication
+            invalidate_cached_tokens()
+            result.updated_count += len(changed)
+            for employee in changed:
+                row_logger.info("[UPLOAD] Сотрудник обновлён: %s (id=%s)", employee.full_name, employee.id)
+        return new
+
+    def write_chunk(self, employees, result):
+        # bulk_create sends no post_save, so cached lists are invalidated here
+        invalidate_employee_lists()
+        if self.upsert:
+            employees = self.update_existing(employees, result)
+        for employee in Employee.objects.bulk_create(employees):
+            count_employee(self.headcount, employee_groups(employee))
+            result.created_count += 1
+            row_logger.info("[UPLOAD] Сотрудник создан: %s (id=%s)", employee.full_name, employee.id)
+
+    def start(self):
+        if self.upsert:
+            quote = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {quote(NICKS_TABLE)}")
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE {quote(NICKS_TABLE)} (nick varchar(50) PRIMARY KEY, line integer NOT NULL)"
+                )
+
+    def finish(self, result):
+        if self.upsert:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {connection.ops.quote_name(NICKS_TABLE)}")
+
+    def report_progress(self):
+        progress = self.progress
+        if progress.total_bytes:
+            logger.info(
+                "[UPLOAD] Обработано строк: %s, байт: %s из %s",
+                progress.rows_processed, progress.bytes_processed, progress.total_bytes,
+            )
+        else:
+            logger.info("[UPLOAD] Обработано строк: %s, байт: %s", progress.rows_processed, progress.bytes_processed)
+        if self.on_progress:
+            self.on_progress(progress)
+
+    def run(self, rows, first_line=2):
+        result = EmployeeImportResult()
+        numbered_rows = enumerate(rows, start=first_line)
+
+        with transaction.atomic():
+            self.start()
+            while chunk := list(islice(numbered_rows, self.batch_size)):
+                employees = self.validate_chunk(chunk, result)
+                # After the first error the rest of the file is only validated, to report it in full
+                if not result.errors:
+                    self.write_chunk(employees, result)
+
+                self.progress.rows_processed += len(chunk)
+                self.report_progress()
+
+                if len(result.errors) >= self.max_errors:
+                    logger.warning("[UPLOAD] Достигнут предел ошибок (%s), проверка остановлена", self.max_errors)
+                    break
+
+            if not result.errors:
+                self.finish(result)
+
+            if result.errors:
+                transaction.set_rollback(True)
+                result.clear()
+            else:
+                # The counter rows are shared by every writer, so they are locked only at the very end
+                apply_deltas(self.headcount)
+
+        return result
+
+
+STAGING_TABLE = "employees_import_staging"
+STAGING_COLUMNS = ("line", "full_name", "position", "specialization", "city", "country", "telegram_nick", "about")
+
+
+class EmployeeStagingImporter(EmployeeBulkImporter):
+    # Same validation, but the rows are streamed into a temporary staging table (COPY on
+    # PostgreSQL, batched INSERTs elsewhere) and moved into employees_employee with one
+    # INSERT ... SELECT that resolves locations and fills the denormalized columns in SQL.
+
+    def validate_row(self, index, row):
+        data = self.serializer.run_validation(row)
+        if self.upsert:
+            self.check_natural_key(index, data.get("telegram_nick"))
+        # Checked here as well, so unknown locations are reported next to the other errors of
+        # the file, the same as by EmployeeBulkImporter; check_locations() is the final word
+        if (data["city"], data["country"]) not in self.locations:
+            raise serializers.ValidationError({
+                "location": f"Локация '{data['city']}, {data['country']}' не найдена в системе."
+            })
+        return (
+            index,
+            data["full_name"],
+            data["position"],
+            data["specialization"],
+            data["city"],
+            data["country"],
+            data.get("telegram_nick"),
+            data.get("about"),
+        )
+
+    def start(self):
+        self.staged_count = 0
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {quote(STAGING_TABLE)}")
+            cursor.execute(f"""
+                CREATE TEMPORARY TABLE {quote(STAGING_TABLE)} (
+                    line integer NOT NULL,
+                    full_name varchar(100) NOT NULL,
+                    {quote("position")} varchar(30) NOT NULL,
+                    specialization varchar(30) NOT NULL,
+                    city varchar(50) NOT NULL,
+                    country varchar(50) NOT NULL,
+                    telegram_nick varchar(50),
+                    about text
+                )
+            """)
+
+    def write_chunk(self, rows, result):
+        write_rows(STAGING_TABLE, STAGING_COLUMNS, rows)
+        self.staged_count += len(rows)
+
+    def check_locations(self, result):
+        quote = connection.ops.quote_name
+        location_table = quote(Location._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT s.line, s.city, s.country
+                FROM {quote(STAGING_TABLE)} s
+                LEFT JOIN {location_table} l ON l.city = s.city AND l.country = s.country
+                WHERE l.id IS NULL
+                ORDER BY s.line
+                LIMIT %s
+                """,
+                [self.max_errors - len(result.errors)],
+            )
+            for index, city, country in cursor.fetchall():
+                error = serializers.ValidationError({"location": f"Локация '{city}, {country}' не найдена в системе."})
+                logger.warning("[UPLOAD] Ошибка в строке %s: %s", index, error.detail)
+                result.errors.append({"line": index, "errors": error.detail})
+
+    def get_manager_values(self):
+        employee = Employee(manager=self.manager)
+        employee.refresh_manager_short_name()
+        if settings.EMPLOYEES_TREE_INDEX:
+            employee.refresh_tree_position()
+        return [employee.manager_id, employee.manager_short_name, employee.tree_path, employee.tree_depth]
+
+    def merge(self):
+        # Returns the number of inserted rows. Nothing is returned per row: the whole file
+        # would be read back into memory.
+        quote = connection.ops.quote_name
+        fields = Employee._meta
+        columns = ", ".join(quote(fields.get_field(name).column) for name in (
+            "full_name", "position", "specialization", "location_id", "telegram_nick", "about",
+            "manager_id", "manager_short_name", "location_city", "location_label", "tree_path", "tree_depth",
+        ))
+        position = quote("position")
+        # In upsert mode the rows matched to an employee have already been applied by update()
+        only_new = f"""
+            WHERE NOT EXISTS (SELECT 1 FROM {quote(fields.db_table)} e WHERE e.telegram_nick = s.telegram_nick)
+        """ if self.upsert else ""
+        source = f"""
+            FROM {quote(STAGING_TABLE)} s
+            JOIN {quote(Location._meta.db_table)} l ON l.city = s.city AND l.country = s.country
+            {only_new}
+        """
+        with connection.cursor() as cursor:
+            # Headcount of the new rows, one row per group
+            cursor.execute(f"""
+                SELECT s.{position}, s.specialization, l.city, COUNT(*)
+                {source}
+                GROUP BY s.{position}, s.specialization, l.city
+            """)
+            manager_id = self.manager.pk if self.manager else None
+            for position_value, specialization, city, count in cursor.fetchall():
+                count_employee(self.headcount, (position_value, specialization, city, manager_id), count)
+
+            cursor.execute(
+                f"""
+                INSERT INTO {quote(fields.db_table)} ({columns})
+                SELECT s.full_name, s.{position}, s.specialization, l.id, s.telegram_nick, s.about,
+                       %s, %s, l.city, l.city || ', ' || l.country, %s, %s
+                {source}
+                ORDER BY s.line
+                """,
+                self.get_manager_values(),
+            )
+            return cursor.rowcount
+
+    def check_repeated_nicks(self, result):
+        # Repeats across chunks are found in the staging table by check_nicks()
+        pass
+
+    def check_nicks(self, result):
+        quote = connection.ops.quote_name
+        staging = quote(STAGING_TABLE)
+        with connection.cursor() as cursor:
+            # Lines repeating a nick of an earlier line
+            cursor.execute(
+                f"""
+                SELECT s.line, s.telegram_nick, first.line
+                FROM {staging} s
+                JOIN (
+                    SELECT telegram_nick, MIN(line) AS line FROM {staging} GROUP BY telegram_nick HAVING COUNT(*) > 1
+                ) first ON first.telegram_nick = s.telegram_nick AND first.line < s.line
+                ORDER BY s.line
+                LIMIT %s
+                """,
+                [self.max_errors],
+            )
+            for line, nick, first_line in cursor.fetchall():
+                self.add_row_error(line, self.repeated_nick_error(nick, first_line), result)
+            if result.errors:
+                return
+
+            # A nick shared by several employees does not say which one to update
+            cursor.execute(
+                f"""
+                SELECT s.line, s.telegram_nick
+                FROM {staging} s
+                JOIN {quote(Employee._meta.db_table)} e ON e.telegram_nick = s.telegram_nick
+                GROUP BY s.line, s.telegram_nick
+                HAVING COUNT(*) > 1
+                ORDER BY s.line
+                LIMIT %s
+                """,
+                [self.max_errors],
+            )
+            for line, nick in cursor.fetchall():
+                self.add_nick_error(nick, line, result)
+
+    def update(self):
+        # Set-based diff: one UPDATE ... FROM writes only the matched rows where something differs.
+        # Returns (updated row count, matched row count).
+        quote = connection.ops.quote_name
+        table = quote(Employee._meta.db_table)
+        staging = quote(STAGING_TABLE)
+        location_table = quote(Location._meta.db_table)
+        position = quote("position")
+        distinct = "IS DISTINCT FROM" if connection.vendor == "postgresql" else "IS NOT"
+        matched = f"""
+            FROM {staging} s
+            JOIN {location_table} l ON l.city = s.city AND l.country = s.country
+            JOIN {table} e ON e.telegram_nick = s.telegram_nick
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) {matched}")
+            matched_count = cursor.fetchone()[0]
+            # Headcount moves of the rows whose groups change; the manager stays the same
+            cursor.execute(f"""
+                SELECT e.{position}, e.specialization, e.location_city, s.{position}, s.specialization, l.city,
+                       e.manager_id, COUNT(*)
+                {matched}
+                WHERE e.{position} <> s.{position} OR e.specialization <> s.specialization OR e.location_city <> l.city
+                GROUP BY e.{position}, e.specialization, e.location_city, s.{position}, s.specialization, l.city,
+                         e.manager_id
+            """)
+            for *groups, manager_id, count in cursor.fetchall():
+                count_employee(self.headcount, (*groups[:3], manager_id), -count)
+                count_employee(self.headcount, (*groups[3:], manager_id), count)
+            self.refresh_renamed_managers(matched)
+            cursor.execute(f"""
+                UPDATE {table} SET
+                    full_name = s.full_name,
+                    {position} = s.{position},
+                    specialization = s.specialization,
+                    location_id = l.id,
+                    about = s.about,
+                    location_city = l.city,
+                    location_label = l.city || ', ' || l.country,
+                    updated_at = %s
+                FROM {staging} s
+                JOIN {location_table} l ON l.city = s.city AND l.country = s.country
+                WHERE {table}.telegram_nick = s.telegram_nick AND (
+                    {table}.full_name <> s.full_name
+                    OR {table}.{position} <> s.{position}
+                    OR {table}.specialization <> s.specialization
+                    OR {table}.location_id <> l.id
+                    OR {table}.about {distinct} s.about
+                )
+            """, [connection.ops.adapt_datetimefield_value(timezone.now())])
+            return cursor.rowcount, matched_count
+
+    def refresh_renamed_managers(self, matched):
+        # Only renamed employees with subordinates matter; they are read in chunks
+        # (a server-side cursor on PostgreSQL), so a file renaming everyone is never held in memory
+        table = connection.ops.quote_name(Employee._meta.db_table)
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT e.id, s.full_name {matched}
+                WHERE e.full_name <> s.full_name
+                  AND EXISTS (SELECT 1 FROM {table} sub WHERE sub.manager_id = e.id)
+            """)
+            while renamed := cursor.fetchmany(self.batch_size):
+                refresh_subordinate_short_names(renamed)
+
+    def finish(self, result):
+        updated_count, matched_count = 0, 0
+        if self.upsert:
+            self.check_nicks(result)
+            if result.errors:
+                self.drop_staging_table()
+                return
+            updated_count, matched_count = self.update()
+
+        # Rows with an unknown location are dropped by the JOIN. If any are missing,
+        # they are reported and the whole upload is rolled back.
+        created_count = self.merge()
+        if created_count + matched_count < self.staged_count:
+            self.check_locations(result)
+            result.errors.sort(key=lambda error: error["line"])
+        else:
+            invalidate_employee_lists()
+            if updated_count:
+                invalidate_cached_tokens()
+            # Rows are moved in SQL, so there is no per-row log here, only the totals
+            logger.info("[UPLOAD] Перенесено из промежуточной таблицы: создано %s, обновлено %s",
+                        created_count, updated_count)
+            result.created_count = created_count
+            result.updated_count = updated_count
+            result.unchanged_count = matched_count - updated_count
+
+        self.drop_staging_table()
+
+    def drop_staging_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {connection.ops.quote_name(STAGING_TABLE)}")
+
+
+def get_importer(**kwargs):
+    if settings.EMPLOYEES_IMPORT_STAGING:
+        return EmployeeStagingImporter(**kwargs)
+    return EmployeeBulkImporter(**kwargs)
@@ -0,0 +1,122 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from employees.importers import EmployeeImportProgress, EmployeeImportResult, get_importer, read_csv_rows
+from employees.models import ImportJob, ImportMode, ImportStatus
+
+logger = logging.getLogger("employees")
+
+_executor = None
+_progress_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor, _progress_executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.EMPLOYEES_IMPORT_WORKERS,
+                thread_name_prefix="employee-import",
+            )
+            # Progress is written from its own thread (and so its own DB connection):
+            # the import transaction stays open until the last row, and writes made
+            # inside it would not be visible to the status endpoint.
+            _progress_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="employee-import-progress")
+        return _executor
+
+
+def enqueue_import_job(job):
+    if settings.EMPLOYEES_IMPORT_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(run_import_job, job.pk))
+    else:
+        # No worker pool configured - the job is processed right after the request commits
+        transaction.on_commit(lambda: process_import_job(job.pk))
+    logger.info("[IMPORT JOB] Задача поставлена в очередь: %s", job.pk)
+
+
+def save_progress(job_id, progress):
+    try:
+        ImportJob.objects.filter(pk=job_id, status=ImportStatus.RUNNING).update(
+            rows_processed=progress.rows_processed,
+            bytes_processed=progress.bytes_processed,
+        )
+    except Exception as e:
+        logger.warning("[IMPORT JOB] Не удалось сохранить прогресс %s: %s", job_id, e)
+    finally:
+        close_old_connections()
+
+
+def run_import_job(job_id):
+    close_old_connections()
+    try:
+        process_import_job(job_id)
+    except Exception:
+        logger.exception("[IMPORT JOB] Необработанная ошибка в задаче %s", job_id)
+    finally:
+        close_old_connections()
+
+
+def process_import_job(job_id):
+    # Claim the job, so a job is never processed twice by different workers
+    claimed = ImportJob.objects.filter(pk=job_id, status=ImportStatus.PENDING).update(
+        status=ImportStatus.RUNNING,
+        started_at=timezone.now(),
+    )
+    if not claimed:
+        logger.info("[IMPORT JOB] Задача %s уже обработана или выполняется", job_id)
+        return
+
+    job = ImportJob.objects.select_related("manager").get(pk=job_id)
+    logger.info("[IMPORT JOB] Начата обработка задачи %s: %s", job.pk, job.file.name)
+
+    progress = EmployeeImportProgress(total_bytes=job.total_bytes)
+
+    def on_progress(current):
+        snapshot = EmployeeImportProgress(total_bytes=current.total_bytes)
+        snapshot.rows_processed = current.rows_processed
+        snapshot.bytes_processed = current.bytes_processed
+        if _progress_executor is not None:
+            _progress_executor.submit(save_progress, job.pk, snapshot)
+
+    try:
+        with job.file.open("rb") as file:
+            importer = get_importer(
+                manager=job.manager,
+                progress=progress,
+                on_progress=on_progress,
+                upsert=job.mode == ImportMode.UPSERT,
+            )
+            result = importer.run(read_csv_rows(file, progress))
+    except UnicodeDecodeError as e:
+        logger.error("[IMPORT JOB] Ошибка чтения файла в задаче %s: %s", job.pk, e)
+        result = EmployeeImportResult()
+        result.errors = [f"Ошибка при чтении файла: {e}"]
+    except Exception as e:
+        logger.error("[IMPORT JOB] Задача %s прервана. Все изменения отменены: %s", job.pk, e)
+        result = EmployeeImportResult()
+        result.errors = ["Загрузка прервана. Все изменения отменены."]
+    errors = result.errors
+
+    job.file.delete(save=False)
+    ImportJob.objects.filter(pk=job.pk).update(
+        status=ImportStatus.FAILED if errors else ImportStatus.SUCCEEDED,
+        file="",
+        rows_processed=progress.rows_processed,
+        bytes_processed=progress.bytes_processed,
+        created_count=result.created_count,
+        updated_count=result.updated_count,
+        unchanged_count=result.unchanged_count,
+        errors=errors,
+        finished_at=timezone.now(),
+    )
+
+    logger.info(
+        "[IMPORT JOB] Задача %s завершена: создано %s, обновлено %s, без изменений %s, ошибок %s",
+        job.pk, result.created_count, result.updated_count, result.unchanged_count, len(errors),
+    )
@@ -0,0 +1,84 @@
+import atexit
+import itertools
+import logging
+import logging.config
+import threading
+from logging.handlers import QueueHandler
+
+# Request threads only put records on a queue (a QueueHandler configured by dictConfig);
+# its listener thread formats them and writes them to the real handlers. File handlers
+# flush once per batch of records instead of once per line.
+
+
+class SamplingFilter(logging.Filter):
+    # Lets through one record out of `rate`. Warnings and errors always pass.
+
+    def __init__(self, rate=1, name=""):
+        super().__init__(name)
+        self.rate = max(int(rate), 1)
+        self.counter = itertools.count()
+
+    def filter(self, record):
+        if self.rate == 1 or record.levelno >= logging.WARNING:
+            return True
+        return next(self.counter) % self.rate == 0
+
+
+class BufferedFileHandler(logging.FileHandler):
+    # Flushes after `batch_size` records, or `flush_interval` seconds after the first record
+    # of a batch even if no more come (a timer thread); errors are written out right away,
+    # and close() (listener stop, exit) flushes the rest
+
+    def __init__(self, filename, batch_size=100, flush_interval=1.0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.timer = None
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            if record.levelno >= logging.ERROR or self.pending >= self.batch_size:
+                self.flush()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self.flush_on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        with self.lock:
+            super().flush()
+            self.pending = 0
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+    def flush_on_timer(self):
+        with self.lock:
+            # A timer that lost the race to a batch flush finds a newer timer (or none) in place
+            if self.timer is threading.current_thread():
+                self.flush()
+
+
+def start_queue_listeners(config):
+    # dictConfig creates the listener of every QueueHandler but leaves starting it to the application
+    listeners = []
+    for name, options in config.get("handlers", {}).items():
+        handler = logging.getHandlerByName(name)
+        if isinstance(handler, QueueHandler) and handler.listener is not None:
+            handler.listener.start()
+            atexit.register(handler.listener.stop)
+            listeners.append(handler.listener)
+    return listeners
+
+
+def configure_logging(config):
+    # Used as LOGGING_CONFIG: the usual dictConfig, then the queue listeners are started
+    logging.config.dictConfig(config)
+    start_queue_listeners(config)
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from employees.cache import invalidate_employee_lists
+from employees.headcount import reconcile
+from employees.models import DENORMALIZED_FIELDS, Employee, short_name
+
+
+class Command(BaseCommand):
+    help = "Заполняет денормализованные поля сотрудников (руководитель кратко, город, рабочее место) пакетами"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пакета (по диапазону id)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Employee.objects.aggregate(min_id=Min("id"), max_id=Max("id"))
+        if bounds["min_id"] is None:
+            self.stdout.write("Сотрудников нет")
+            return
+
+        updated = 0
+        for start in range(bounds["min_id"], bounds["max_id"] + 1, batch_size):
+            rows = Employee.objects.filter(id__gte=start, id__lt=start + batch_size).values_list(
+                "id", *DENORMALIZED_FIELDS, "manager__full_name", "location__city", "location__country"
+            )
+            now = timezone.now()
+            employees = []
+            for pk, *current, manager_full_name, city, country in rows:
+                values = (short_name(manager_full_name) if manager_full_name else None, city, f"{city}, {country}")
+                # Rows that are already up to date keep their updated_at (and ETag)
+                if tuple(current) != values:
+                    employees.append(Employee(id=pk, **dict(zip(DENORMALIZED_FIELDS, values)), updated_at=now))
+            # Each batch is committed on its own, so the command can be stopped and rerun at any time
+            with transaction.atomic():
+                Employee.objects.bulk_update(employees, [*DENORMALIZED_FIELDS, "updated_at"])
+                if employees:
+                    invalidate_employee_lists()
+
+            updated += len(employees)
+            self.stdout.write(f"Обновлено: {updated}")
+
+        if updated:
+            # City counters are grouped by location_city and may have counted the stale copies
+            # (or been seeded from the locations themselves), so they are recounted once at the end
+            drift = reconcile()
+            self.stdout.write(f"Исправлено счётчиков численности: {len(drift)}")
+        self.stdout.write(self.style.SUCCESS(f"Готово, обновлено сотрудников: {updated}"))
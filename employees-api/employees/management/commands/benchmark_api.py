@@ -0,0 +1,176 @@
+import base64
+import json
+import random
+import time
+from contextlib import nullcontext
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from employees.benchmarks import (
+    ensure_employees,
+    find_regressions,
+    peak_memory_kb,
+    read_results,
+    summarize,
+    write_results,
+)
+from employees.cache import bump_generation
+from employees.metrics import QueryStats
+from employees.models import City, Country, Employee, Position, Specialization
+
+
+class Command(BaseCommand):
+    help = (
+        "Набор бенчмарков API сотрудников: список (с фильтрами и глубокими страницами), карточка, создание "
+        "и массовая загрузка. Запросы выполняются внутри процесса, без HTTP-сервера; записи откатываются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000,
+                            help='Сколько сотрудников должно быть в базе (например, 10000, 100000, 1000000)')
+        parser.add_argument('--repeat', type=int, default=30, help='Повторов на каждый сценарий')
+        parser.add_argument('--upload-sizes', default='100,1000,10000', help='Размеры загружаемых файлов, строк')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно для выбора сотрудников')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--baseline', help='JSON-файл прошлого запуска для сравнения')
+        parser.add_argument('--max-slowdown', type=float, default=20,
+                            help='Допустимое замедление p50 относительно --baseline, процентов')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Завершиться с ошибкой, если есть регрессия относительно --baseline')
+
+    def keyset_cursor(self, queryset):
+        full_name, pk = queryset.values_list("full_name", "id")[queryset.count() // 2]
+        encoded = base64.urlsafe_b64encode(json.dumps([full_name, pk], ensure_ascii=False).encode("utf-8"))
+        return encoded.decode("ascii")
+
+    def get_read_scenarios(self, rng, rows):
+        base = Employee.objects.order_by("full_name", "id")
+        manager_id = base.filter(manager__isnull=True).values_list("id", flat=True).first()
+        ids = list(base.values_list("id", flat=True)[:1000])
+        deep_page = max(rows // 20 // 2, 1)
+
+        page = {"page_size": 20}
+        # name: (path or a function returning one, query parameters, bypass the list page cache)
+        return {
+            "list_cached": ("/api/v1/employees/", page, False),
+            "list": ("/api/v1/employees/", page, True),
+            "list_position": ("/api/v1/employees/", {**page, "position": Position.SENIOR}, True),
+            "list_city_specialization": (
+                "/api/v1/employees/",
+                {**page, "location__city": City.PARIS, "specialization": Specialization.DEVOPS},
+                True,
+            ),
+            "list_manager": ("/api/v1/employees/", {**page, "manager": manager_id}, True),
+            "list_deep_page": ("/api/v1/employees/", {**page, "page": deep_page}, True),
+            "list_deep_keyset": ("/api/v1/employees/", {**page, "cursor": self.keyset_cursor(base), "count": "false"}, True),
+            "detail": (lambda: f"/api/v1/employees/{rng.choice(ids)}/", None, False),
+        }
+
+    def make_upload(self, rng, size):
+        lines = ["full_name,position,specialization,city,country,telegram_nick,about"]
+        for index in range(size):
+            lines.append(",".join((
+                f"Бенчмарков Тест {index}",
+                rng.choice(Position.values),
+                rng.choice(Specialization.values),
+                City.MOSCOW,
+                Country.RUSSIA,
+                f"@bench{index}",
+                "",
+            )))
+        return "\n".join(lines).encode("utf-8")
+
+    def get_write_scenarios(self, rng, upload_sizes):
+        create_data = {
+            "full_name": "Бенчмарков Тест Тестович",
+            "position": Position.JUNIOR,
+            "specialization": Specialization.PYTHON,
+            "city": City.MOSCOW,
+            "country": Country.RUSSIA,
+        }
+        scenarios = {"create": lambda client: client.post("/api/v1/employees/create/", create_data)}
+        for size in upload_sizes:
+            content = self.make_upload(rng, size)
+            scenarios[f"upload_{size}"] = lambda client, content=content: client.post(
+                "/api/v1/employees/upload/", {"file": SimpleUploadedFile("employees.csv", content)}
+            )
+        return scenarios
+
+    def run_scenario(self, request, repeat, before=None, rollback=False):
+        # Times `repeat` calls of request(); writes are rolled back after each call so the base stays the same
+        statuses = set()
+
+        def call(queries):
+            if before:
+                before()
+            with transaction.atomic() if rollback else nullcontext():
+                with connection.execute_wrapper(queries):
+                    started = time.perf_counter()
+                    response = request()
+                    elapsed = (time.perf_counter() - started) * 1000
+                if rollback:
+                    transaction.set_rollback(True)
+            statuses.add(response.status_code)
+            return elapsed
+
+        call(QueryStats())  # warmup
+        queries = QueryStats()
+        stats = summarize([call(queries) for _ in range(repeat)])
+        stats["rps"] = round(1000 / stats["mean_ms"], 1) if stats["mean_ms"] else None
+        stats["queries_per_request"] = round(queries.count / repeat, 2)
+        stats["peak_memory_kb"] = peak_memory_kb(lambda: call(QueryStats()))
+        stats["statuses"] = sorted(statuses)
+        return stats
+
+    def handle(self, *args, **options):
+        rows = ensure_employees(options['rows'], stdout=self.stdout)
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+        try:
+            upload_sizes = [int(size) for size in options['upload_sizes'].split(",") if size.strip()]
+        except ValueError:
+            raise CommandError("--upload-sizes: ожидается список чисел через запятую")
+
+        self.stdout.write(f"База: {connection.vendor}, сотрудников: {rows}")
+        results = {"vendor": connection.vendor, "rows": rows, "repeat": repeat, "scenarios": {}}
+
+        client = Client(SERVER_NAME="localhost")
+        with override_settings(ALLOWED_HOSTS=["localhost"], EMPLOYEES_QUERY_GUARD="off"):
+            for name, (path, params, uncached) in self.get_read_scenarios(rng, rows).items():
+                def request(path=path, params=params):
+                    return client.get(path() if callable(path) else path, params)
+                # Bumping the generation makes every request miss the list page cache
+                before = bump_generation if uncached else None
+                results["scenarios"][name] = self.run_scenario(request, repeat, before=before)
+                self.write_stats(name, results["scenarios"][name])
+
+            for name, post in self.get_write_scenarios(rng, upload_sizes).items():
+                # Big uploads are slow, so they are repeated fewer times
+                count = repeat if name == "create" else max(repeat // 10, 3)
+                results["scenarios"][name] = self.run_scenario(lambda post=post: post(client), count, rollback=True)
+                self.write_stats(name, results["scenarios"][name])
+
+        if options['output']:
+            write_results(options['output'], results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+
+        if options['baseline']:
+            baseline = read_results(options['baseline'])
+            regressions = find_regressions(baseline["scenarios"], results["scenarios"], options['max_slowdown'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f"Регрессия: {regression}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("Регрессий относительно базового запуска нет"))
+            elif options['fail_on_regression']:
+                raise CommandError(f"Найдено регрессий: {len(regressions)}")
+
+    def write_stats(self, name, stats):
+        self.stdout.write(
+            f"{name:>26}: p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms  p99={stats['p99_ms']} ms  "
+            f"rps={stats['rps']}  запросов={stats['queries_per_request']}  память={stats['peak_memory_kb']} KB  "
+            f"статусы={stats['statuses']}"
+        )
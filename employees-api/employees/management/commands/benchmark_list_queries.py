@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Q
+
+from employees.benchmarks import ensure_employees, explain, measure, write_results
+from employees.models import Employee, Position, Specialization, City
+
+
+class Command(BaseCommand):
+    help = "Показывает планы и время запросов списка сотрудников для каждой комбинации фильтров"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Сколько сотрудников должно быть в базе (недостающие будут созданы)')
+        parser.add_argument('--repeat', type=int, default=50, help='Повторов на каждый запрос')
+        parser.add_argument('--page-size', type=int, default=20, help='Размер страницы')
+        parser.add_argument('--no-plans', action='store_true', help='Не выводить планы запросов')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+
+    def get_filter_sets(self):
+        manager_id = (
+            Employee.objects.filter(subordinates__isnull=False)
+            .annotate(subordinates_count=Count("subordinates"))
+            .order_by("-subordinates_count")
+            .values_list("id", flat=True)
+            .first()
+        )
+        filter_sets = {
+            "no filters": {},
+            "position": {"position": Position.MANAGER},
+            "specialization": {"specialization": Specialization.PYTHON},
+            "position + specialization": {"position": Position.SENIOR, "specialization": Specialization.DEVOPS},
+            "location_city": {"location_city": City.MOSCOW},
+            "manager": {"manager": manager_id},
+            "manager is null": {"manager__isnull": True},
+        }
+        return filter_sets
+
+    def handle(self, *args, **options):
+        rows = ensure_employees(options['rows'], stdout=self.stdout)
+        page_size = options['page_size']
+        self.stdout.write(f"База: {connection.vendor}, сотрудников: {rows}")
+
+        base = Employee.objects.order_by("full_name", "id")
+        results = {"vendor": connection.vendor, "rows": rows, "page_size": page_size, "queries": {}}
+
+        for name, filters in self.get_filter_sets().items():
+            queryset = base.filter(**filters)
+
+            # Position in the middle of the filtered set, as a deep keyset page would see it
+            middle = queryset.values_list("full_name", "id")[queryset.count() // 2:][:1]
+            middle = middle[0] if middle else ("", 0)
+            deep = queryset.filter(full_name__gte=middle[0]).filter(
+                Q(full_name__gt=middle[0]) | Q(full_name=middle[0], id__gt=middle[1])
+            )
+
+            first_page = queryset[:page_size]
+            deep_page = deep[:page_size]
+
+            entry = {
+                "first_page": measure(lambda: list(first_page.all()), repeat=options['repeat']),
+                "deep_keyset_page": measure(lambda: list(deep_page.all()), repeat=options['repeat']),
+                "count": measure(lambda: queryset.count(), repeat=options['repeat']),
+            }
+            if not options['no_plans']:
+                entry["first_page_plan"] = explain(first_page)
+                entry["deep_keyset_page_plan"] = explain(deep_page)
+            results["queries"][name] = entry
+
+            described = ", ".join(f"{key}={value}" for key, value in filters.items())
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {name} ({described})"))
+            for key in ("first_page", "deep_keyset_page", "count"):
+                stats = entry[key]
+                self.stdout.write(
+                    f"{key:>18}: p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms  p99={stats['p99_ms']} ms"
+                )
+            if not options['no_plans']:
+                self.stdout.write(entry["first_page_plan"])
+                self.stdout.write(entry["deep_keyset_page_plan"])
+
+        if options['output']:
+            write_results(options['output'], results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
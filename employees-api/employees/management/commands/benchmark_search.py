@@ -0,0 +1,59 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from employees.benchmarks import ensure_employees, measure, write_results
+from employees.models import Employee
+from employees.search import search_employees
+
+
+class Command(BaseCommand):
+    help = "Замеряет задержку поиска сотрудников (p50/p95/p99) на большой базе"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Сколько сотрудников должно быть в базе (недостающие будут созданы)')
+        parser.add_argument('--repeat', type=int, default=200, help='Повторов на каждый вид запроса')
+        parser.add_argument('--limit', type=int, default=20, help='Размер выдачи')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно для выбора поисковых запросов')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+
+    def get_queries(self, rng, count):
+        # Real names and words from the base, typed the way people type them
+        sample = list(Employee.objects.order_by("?").values_list("full_name", "about")[:count])
+        queries = {"full name": [], "surname prefix": [], "surname typo": [], "name + about word": []}
+        for full_name, about in sample:
+            surname = full_name.split()[0]
+            queries["full name"].append(full_name)
+            queries["surname prefix"].append(surname[:4])
+            position = rng.randrange(1, len(surname))
+            queries["surname typo"].append(surname[:position] + surname[position + 1:])
+            words = (about or "").split()
+            queries["name + about word"].append(f"{surname} {rng.choice(words) if words else ''}".strip())
+        return queries
+
+    def handle(self, *args, **options):
+        rows = ensure_employees(options['rows'], stdout=self.stdout)
+        rng = random.Random(options['seed'])
+        results = {"vendor": connection.vendor, "rows": rows, "limit": options['limit'], "queries": {}}
+        self.stdout.write(f"База: {connection.vendor}, сотрудников: {rows}")
+
+        for name, queries in self.get_queries(rng, options['repeat']).items():
+            found = []
+            iterator = iter(queries * 2)
+
+            def run():
+                found.append(len(search_employees(next(iterator), options['limit'])))
+
+            stats = measure(run, repeat=len(queries), warmup=min(len(queries), 5))
+            stats["mean_results"] = round(sum(found) / len(found), 1) if found else 0
+            results["queries"][name] = stats
+            self.stdout.write(
+                f"{name:>18}: p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms  p99={stats['p99_ms']} ms  "
+                f"найдено в среднем: {stats['mean_results']}"
+            )
+
+        if options['output']:
+            write_results(options['output'], results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from employees.benchmarks import ensure_employees, measure, write_results
+from employees.fast_serializers import (
+    DETAIL_FIELDS,
+    LIST_FIELDS,
+    serialize_detail_row,
+    serialize_list_rows,
+)
+from employees.models import Employee
+from employees.renderers import FastJSONRenderer
+from employees.serializers import EmployeeDetailSerializer, EmployeeListSerializer
+
+
+class Command(BaseCommand):
+    help = "Сравнивает DRF-сериализаторы сотрудников с быстрыми сериализаторами на больших страницах"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=10_000, help='Размер страницы')
+        parser.add_argument('--repeat', type=int, default=10, help='Повторов на каждый замер')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        repeat = options['repeat']
+        ensure_employees(page_size, stdout=self.stdout)
+
+        queryset = Employee.objects.select_related("manager", "location").order_by("full_name", "id")[:page_size]
+        objects = list(queryset)
+        list_rows = list(queryset.values(*LIST_FIELDS))
+        detail_rows = list(queryset.values(*DETAIL_FIELDS))
+
+        drf_renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+
+        drf_list = drf_renderer.render(EmployeeListSerializer(objects, many=True).data)
+        fast_list = fast_renderer.render(serialize_list_rows(list_rows))
+        drf_detail = drf_renderer.render(EmployeeDetailSerializer(objects, many=True).data)
+        fast_detail = fast_renderer.render([serialize_detail_row(row) for row in detail_rows])
+        if drf_list != fast_list or drf_detail != fast_detail:
+            raise CommandError("Быстрые сериализаторы дают другой JSON, чем DRF-сериализаторы")
+
+        results = {
+            "page_size": page_size,
+            "list": {
+                "drf_serialize": measure(lambda: EmployeeListSerializer(objects, many=True).data, repeat, 1),
+                "drf_render": measure(
+                    lambda: drf_renderer.render(EmployeeListSerializer(objects, many=True).data), repeat, 1
+                ),
+                "drf_query_and_render": measure(
+                    lambda: drf_renderer.render(EmployeeListSerializer(list(queryset.all()), many=True).data),
+                    repeat, 1,
+                ),
+                "fast_serialize": measure(lambda: serialize_list_rows(list_rows), repeat, 1),
+                "fast_render": measure(lambda: fast_renderer.render(serialize_list_rows(list_rows)), repeat, 1),
+                "fast_query_and_render": measure(
+                    lambda: fast_renderer.render(serialize_list_rows(queryset.values(*LIST_FIELDS))),
+                    repeat, 1,
+                ),
+            },
+            "detail": {
+                "drf_render": measure(
+                    lambda: drf_renderer.render(EmployeeDetailSerializer(objects, many=True).data), repeat, 1
+                ),
+                "fast_render": measure(
+                    lambda: fast_renderer.render([serialize_detail_row(row) for row in detail_rows]), repeat, 1
+                ),
+            },
+        }
+
+        for endpoint in ("list", "detail"):
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {endpoint}, {page_size} строк"))
+            for name, stats in results[endpoint].items():
+                self.stdout.write(f"{name:>22}: p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms")
+
+        speedup = results["list"]["drf_render"]["p50_ms"] / results["list"]["fast_render"]["p50_ms"]
+        self.stdout.write(self.style.SUCCESS(f"\nУскорение сериализации и рендеринга списка: x{speedup:.1f}"))
+
+        if options['output']:
+            write_results(options['output'], results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from employees.cache import invalidate_employee_lists
+from employees.tree import find_broken_nodes, rebuild_tree
+
+
+class Command(BaseCommand):
+    help = "Проверяет, что пути сотрудников в оргструктуре совпадают с полем manager"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Пересчитать оргструктуру, если найдены расхождения')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько id сотрудников с расхождениями вывести')
+
+    def handle(self, *args, **options):
+        broken = sorted(find_broken_nodes())
+        if not broken:
+            self.stdout.write(self.style.SUCCESS("Оргструктура согласована"))
+            return
+
+        shown = ", ".join(map(str, broken[:options['limit']]))
+        self.stdout.write(self.style.WARNING(f"Расхождений: {len(broken)} (id: {shown})"))
+
+        if not options['fix']:
+            raise CommandError("Оргструктура не согласована, запустите с --fix или rebuild_employee_tree")
+
+        rebuild_tree()
+        invalidate_employee_lists()
+        broken = list(find_broken_nodes())
+        if broken:
+            raise CommandError(f"После пересчёта остались расхождения (цикл подчинения?): {len(broken)}")
+        self.stdout.write(self.style.SUCCESS("Оргструктура пересчитана"))
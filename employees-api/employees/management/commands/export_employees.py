@@ -0,0 +1,22 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from employees.exporters import export_csv
+from employees.models import Employee
+
+
+class Command(BaseCommand):
+    help = "Выгружает сотрудников в CSV в формате загрузки (upload/)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл для выгрузки (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        queryset = Employee.objects.order_by("id")
+        if options['output']:
+            with open(options['output'], "w", encoding="utf-8", newline="") as file:
+                export_csv(queryset, file)
+            self.stderr.write(self.style.SUCCESS(f"Сотрудники выгружены в {options['output']}"))
+        else:
+            export_csv(queryset, sys.stdout)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from employees.benchmarks import summarize, write_results
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Соединение закрыто сервером")
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while size := int((await reader.readline()).split(b";")[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    return status, headers.get("connection", "").lower() != "close"
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест HTTP API: держит заданное число keep-alive соединений и замеряет "
+        "пропускную способность и задержки. Запускается против WSGI- и ASGI-развёртывания по очереди"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес, например http://127.0.0.1:8000/api/v1/employees/async/')
+        parser.add_argument('--connections', type=int, default=100, help='Одновременных соединений')
+        parser.add_argument('--duration', type=float, default=30, help='Длительность теста, секунд')
+        parser.add_argument('--output', help='Сохранить результаты в JSON-файл')
+
+    async def worker(self, url, deadline, timings, statuses):
+        path = url.path or "/"
+        if url.query:
+            path += f"?{url.query}"
+        request = f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: keep-alive\r\n\r\n".encode()
+
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                started = time.perf_counter()
+                writer.write(request)
+                status, keep_alive = await read_response(reader)
+                timings.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                statuses["error"] = statuses.get("error", 0) + 1
+                keep_alive = False
+            if not keep_alive and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    async def run(self, url, connections, duration):
+        timings, statuses = [], {}
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(self.worker(url, deadline, timings, statuses) for _ in range(connections)))
+        return timings, statuses, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("Поддерживаются только адреса вида http://host:port/path")
+
+        timings, statuses, elapsed = asyncio.run(self.run(url, options['connections'], options['duration']))
+        stats = summarize(timings)
+        results = {
+            "url": options['url'],
+            "connections": options['connections'],
+            "duration_s": round(elapsed, 3),
+            "requests": len(timings),
+            "rps": round(len(timings) / elapsed, 1),
+            "statuses": {str(status): count for status, count in statuses.items()},
+            "latency": stats,
+        }
+
+        self.stdout.write(f"Соединений: {options['connections']}, запросов: {len(timings)} за {elapsed:.1f} с")
+        self.stdout.write(f"Ответы: {results['statuses']}")
+        self.stdout.write(
+            f"RPS: {results['rps']}  p50={stats['p50_ms']} ms  p95={stats['p95_ms']} ms  p99={stats['p99_ms']} ms"
+        )
+
+        if options['output']:
+            write_results(options['output'], results)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
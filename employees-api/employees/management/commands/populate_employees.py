@@ -1,11 +1,15 @@
-import random
+import time
+from collections import Counter
 
-from django.core.management.base import BaseCommand
-from faker import Faker
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
 
-from employees.models import Employee, Location, Position, Specialization
-
-fake = Faker('ru_RU')
+from employees.cache import invalidate_employee_lists
+from employees.generators import COLUMNS, EmployeeGenerator
+from employees.headcount import GROUP_FIELDS, apply_deltas, count_employee
+from employees.models import Employee, Location
+from employees.bulk import reserve_ids, write_rows
 
 
 class Command(BaseCommand):
@@ -13,44 +17,55 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('--count', type=int, default=100, help='Количество сотрудников')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Сколько строк записывать за раз')
+        parser.add_argument('--seed', type=int, help='Зерно генератора, для воспроизводимых данных')
+        parser.add_argument('--roots', type=int, default=5, help='Сколько сотрудников без руководителя')
+        parser.add_argument('--fanout', type=int, default=5, help='Сколько подчинённых у каждого руководителя')
+        parser.add_argument('--name-pool', type=int, default=10_000, help='Размер пула имён, ников и фраз')
 
     def handle(self, *args, **options):
         count = options['count']
+        if options['roots'] < 1 or options['fanout'] < 2:
+            raise CommandError("Нужен хотя бы один корень и не меньше двух подчинённых у руководителя")
+
+        locations = list(Location.objects.all())
+        if not locations:
+            raise CommandError("В базе нет ни одной локации")
+
+        generator = EmployeeGenerator(
+            locations,
+            roots=options['roots'],
+            fanout=options['fanout'],
+            seed=options['seed'],
+            pool_size=options['name_pool'],
+        )
+        # On PostgreSQL ids come from the sequence; elsewhere they simply continue after the last one
+        use_sequence = connection.vendor == "postgresql"
+        next_id = (Employee.objects.aggregate(max_id=Max("id"))["max_id"] or 0) + 1
+        columns = [Employee._meta.get_field(name).column for name in COLUMNS]
+        group_indexes = [COLUMNS.index(field) for field in GROUP_FIELDS]
+        headcount = Counter()
+        started = time.perf_counter()
+
+        with transaction.atomic():
+            while generator.generated < count:
+                size = generator.next_chunk_size(min(options['batch_size'], count - generator.generated))
+                if use_sequence:
+                    ids = reserve_ids(Employee, size)
+                else:
+                    ids = range(next_id, next_id + size)
+                    next_id += size
+                rows = generator.build_rows(ids)
+                write_rows(Employee._meta.db_table, columns, rows)
+                for row in rows:
+                    count_employee(headcount, [row[index] for index in group_indexes])
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Записано {generator.generated} из {count}")
+
+            # Rows are written without save(), so the counters and cached lists are updated here
+            apply_deltas(headcount)
+            invalidate_employee_lists()
 
-        # Step 1 - create locations
-        locations = Location.objects.all()
-
-        # Step 2 - create employees
-        employees = []
-
-        for _ in range(count):
-            full_name = fake.name()
-            position = random.choice(Position.values)
-            specialization = random.choice(Specialization.values)
-            location = random.choice(locations)
-            telegram_nick = f"@{fake.unique.user_name()}"
-            about = fake.sentence(nb_words=10)
-
-            emp = Employee(
-                full_name=full_name,
-                position=position,
-                specialization=specialization,
-                location=location,
-                telegram_nick=telegram_nick,
-                about=about,
-                manager=None,
-            )
-            employees.append(emp)
-
-        Employee.objects.bulk_create(employees)
-
-        # Step 3 - add managers
-        all_employees = list(Employee.objects.order_by("id"))
-
-        for idx, emp in enumerate(all_employees):
-            if idx >= 5:
-                manager_index = (idx // 5) - 1
-                emp.manager = all_employees[manager_index]
-                emp.save()
-
-        self.stdout.write(self.style.SUCCESS(f"Создано {len(all_employees)} сотрудников"))
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Создано {count} сотрудников за {elapsed:.1f} с ({rate:.0f} строк/с)"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from employees.jobs import process_import_job
+from employees.models import ImportJob, ImportStatus
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает фоновые загрузки сотрудников, оставшиеся в очереди (например, после перезапуска)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Вернуть в очередь задачи, прерванные во время выполнения')
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = ImportJob.objects.filter(status=ImportStatus.RUNNING).update(
+                status=ImportStatus.PENDING,
+                started_at=None,
+            )
+            self.stdout.write(f"Возвращено в очередь: {requeued}")
+
+        job_ids = list(
+            ImportJob.objects.filter(status=ImportStatus.PENDING).order_by("created_at").values_list("pk", flat=True)
+        )
+        for job_id in job_ids:
+            process_import_job(job_id)
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано задач: {len(job_ids)}"))
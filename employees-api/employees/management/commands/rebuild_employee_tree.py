@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from employees.cache import invalidate_employee_lists
+from employees.tree import find_broken_nodes, rebuild_tree
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает пути сотрудников в оргструктуре (tree_path, tree_depth) по полю manager"
+
+    def handle(self, *args, **options):
+        levels = rebuild_tree()
+        invalidate_employee_lists()
+        self.stdout.write(self.style.SUCCESS(f"Оргструктура пересчитана, уровней подчинения: {levels}"))
+
+        broken = list(find_broken_nodes())
+        if broken:
+            self.stdout.write(self.style.WARNING(
+                f"Сотрудники в цикле подчинения, путь не определён: {', '.join(map(str, sorted(broken)))}"
+            ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from employees.headcount import reconcile
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики численности сотрудников с нуля и сообщает о расхождениях"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только сообщить о расхождениях, не исправляя их')
+        parser.add_argument('--limit', type=int, default=20, help='Сколько расхождений вывести')
+
+    def handle(self, *args, **options):
+        drift = reconcile(fix=not options['dry_run'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Счётчики численности согласованы"))
+            return
+
+        self.stdout.write(self.style.WARNING(f"Расхождений: {len(drift)}"))
+        for dimension, value, stored, actual in drift[:options['limit']]:
+            self.stdout.write(f"  {dimension}={value or '—'}: в счётчике {stored}, на самом деле {actual}")
+
+        if options['dry_run']:
+            raise CommandError("Счётчики численности не согласованы, запустите без --dry-run")
+        self.stdout.write(self.style.SUCCESS("Счётчики численности пересчитаны"))
@@ -0,0 +1,115 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+# Per-endpoint request metrics, kept in memory of the current process and exposed at
+# /metrics in the Prometheus text format. Every worker process keeps its own numbers.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stats of the request being handled. A context variable rather than a wrapper per request:
+# async views run their queries in a worker thread, on another connection object, but with
+# a copy of the request's context.
+current_queries = ContextVar("current_queries", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # Stays in connection.execute_wrappers of every connection (see signals.py)
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+class QueryStats:
+    # Counts the queries of one request and their time; with a fingerprint function
+    # also how many times each query shape ran (see query_guard.py)
+
+    def __init__(self, fingerprint=None):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprint = fingerprint
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+            if self.fingerprint:
+                self.shapes[self.fingerprint(sql)] += 1
+
+
+class EndpointStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.db_queries = 0
+        self.db_duration = 0.0
+        self.response_bytes = 0
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def observe(self, endpoint, method, status, duration, db_queries, db_duration, response_bytes):
+        key = (endpoint, method, str(status))
+        with self.lock:
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            index = bisect_left(LATENCY_BUCKETS, duration)
+            if index < len(LATENCY_BUCKETS):
+                stats.buckets[index] += 1
+            stats.count += 1
+            stats.duration += duration
+            stats.db_queries += db_queries
+            stats.db_duration += db_duration
+            stats.response_bytes += response_bytes or 0
+
+    def render(self):
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            lines = [
+                "# HELP employees_http_request_duration_seconds Время обработки запроса.",
+                "# TYPE employees_http_request_duration_seconds histogram",
+            ]
+            for key, stats in endpoints:
+                labels = format_labels(key)
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'employees_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'employees_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f"employees_http_request_duration_seconds_sum{{{labels}}} {stats.duration}")
+                lines.append(f"employees_http_request_duration_seconds_count{{{labels}}} {stats.count}")
+
+            for name, attribute, description in (
+                ("employees_http_db_queries_total", "db_queries", "SQL-запросов выполнено."),
+                ("employees_http_db_duration_seconds_total", "db_duration", "Время выполнения SQL-запросов."),
+                ("employees_http_response_bytes_total", "response_bytes", "Отправлено байт в ответах."),
+            ):
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} counter")
+                for key, stats in endpoints:
+                    lines.append(f"{name}{{{format_labels(key)}}} {getattr(stats, attribute)}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(key):
+    endpoint, method, status = key
+    return f'endpoint="{escape_label(endpoint)}",method="{escape_label(method)}",status="{status}"'
+
+
+request_metrics = RequestMetrics()
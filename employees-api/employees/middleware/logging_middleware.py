@@ -1,24 +1,100 @@
 import logging
+import time
 import traceback
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from employees.metrics import QueryStats, current_queries, request_metrics
+from employees.query_guard import GUARD_OFF, check_queries, fingerprint
+
 logger = logging.getLogger("employees")
 
 class RequestLoggingMiddleware:
+    # Works in both stacks: under ASGI with async views the request stays on the event loop
+    # instead of hopping to a thread just to be logged
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        method = request.method
-        path = request.get_full_path()
-        ip = request.META.get("REMOTE_ADDR")
-
-        logger.info(f"[REQUEST] {method} {path} from {ip}")
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
 
+        method, path, ip = self.log_request(request)
+        queries = self.start_query_stats()
+        token = current_queries.set(queries)
+        start = time.perf_counter()
         try:
             response = self.get_response(request)
         except Exception as e:
-            logger.error(f"[EXCEPTION] {method} {path} from {ip} → {e}")
-            logger.debug(traceback.format_exc())
+            self.log_exception(method, path, ip, e)
+            raise
+        finally:
+            current_queries.reset(token)
+
+        self.finish(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        method, path, ip = self.log_request(request)
+        queries = self.start_query_stats()
+        token = current_queries.set(queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        except Exception as e:
+            self.log_exception(method, path, ip, e)
             raise
+        finally:
+            current_queries.reset(token)
 
+        self.finish(request, response, time.perf_counter() - start, queries)
         return response
+
+    def start_query_stats(self):
+        guarded = settings.EMPLOYEES_QUERY_GUARD != GUARD_OFF
+        return QueryStats(fingerprint=fingerprint if guarded else None)
+
+    def log_request(self, request):
+        method = request.method
+        path = request.get_full_path()
+        ip = request.META.get("REMOTE_ADDR")
+
+        logger.info("[REQUEST] %s %s from %s", method, path, ip)
+        return method, path, ip
+
+    def log_exception(self, method, path, ip, e):
+        logger.error("[EXCEPTION] %s %s from %s → %s", method, path, ip, e)
+        logger.debug(traceback.format_exc())
+
+    def finish(self, request, response, duration, queries):
+        check_queries(request, queries)
+
+        # Streaming responses are sent after the middleware returns, their size is unknown here
+        size = None if response.streaming else len(response.content)
+        endpoint = request.resolver_match.route if request.resolver_match else "<unmatched>"
+        request_metrics.observe(
+            endpoint, request.method, response.status_code, duration, queries.count, queries.duration, size
+        )
+
+        total_ms = duration * 1000
+        db_ms = queries.duration * 1000
+        response["Server-Timing"] = f"db;dur={db_ms:.1f}, app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}"
+
+        if total_ms >= settings.EMPLOYEES_SLOW_REQUEST_MS:
+            logger.warning(
+                "[SLOW REQUEST] %s %s → %s за %.1f мс (SQL: %s запросов, %.1f мс), %s байт",
+                request.method, request.get_full_path(), response.status_code,
+                total_ms, queries.count, db_ms, "-" if size is None else size,
+            )
+        else:
+            logger.debug(
+                "[RESPONSE] %s %s → %s за %.1f мс (SQL: %s запросов, %.1f мс), %s байт",
+                request.method, request.get_full_path(), response.status_code,
+                total_ms, queries.count, db_ms, "-" if size is None else size,
+            )
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0004_importjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['full_name', 'id'], name='employee_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['position', 'full_name', 'id'], name='employee_position_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['specialization', 'full_name', 'id'], name='employee_spec_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['position', 'specialization', 'full_name', 'id'], name='employee_pos_spec_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['location', 'full_name', 'id'], name='employee_location_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['manager', 'full_name', 'id'], name='employee_manager_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(condition=models.Q(('manager__isnull', True)), fields=['full_name', 'id'], name='employee_root_name_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def fill_denormalized_fields(apps, schema_editor):
+    # Existing rows get their copies here: the list filters by location_city, so an empty
+    # column would hide every employee until backfill_denormalized_fields was run
+    from employees.models import short_name
+
+    Employee = apps.get_model("employees", "Employee")
+    Location = apps.get_model("employees", "Location")
+
+    for location in Location.objects.all():
+        Employee.objects.filter(location=location).update(
+            location_city=location.city,
+            location_label=f"{location.city}, {location.country}",
+        )
+
+    managers = list(Employee.objects.filter(subordinates__isnull=False).distinct().values_list("id", "full_name"))
+    for start in range(0, len(managers), 500):
+        batch = managers[start:start + 500]
+        Employee.objects.filter(manager_id__in=[pk for pk, _ in batch]).update(manager_short_name=Case(
+            *(When(manager_id=pk, then=Value(short_name(full_name))) for pk, full_name in batch)
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0005_employee_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='employee',
+            name='employee_location_name_idx',
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='location_city',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50, verbose_name='Город'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='location_label',
+            field=models.CharField(blank=True, default='', editable=False, max_length=102, verbose_name='Рабочее место (полностью)'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='manager_short_name',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, verbose_name='Руководитель (кратко)'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['location_city', 'full_name', 'id'], name='employee_city_name_idx'),
+        ),
+        migrations.RunPython(fill_denormalized_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_tree_paths(apps, schema_editor):
+    from employees.tree import rebuild_tree
+
+    rebuild_tree(apps.get_model("employees", "Employee"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0006_employee_denormalized_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='tree_depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Уровень в оргструктуре'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='tree_path',
+            field=models.CharField(default='/', editable=False, max_length=500, verbose_name='Путь в оргструктуре'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['tree_path'], name='employee_tree_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(build_tree_paths, migrations.RunPython.noop),
+    ]
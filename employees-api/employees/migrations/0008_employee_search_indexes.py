@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:20
+
+from django.db import migrations, models
+
+# Full-text and trigram indexes for employees.search. They only exist on PostgreSQL,
+# other databases use the in-process inverted index instead.
+SEARCH_INDEXES = [
+    (
+        "CREATE INDEX IF NOT EXISTS employee_search_idx ON employees_employee USING gin (("
+        "setweight(to_tsvector('russian', full_name), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(about, '')), 'B')))",
+        "DROP INDEX IF EXISTS employee_search_idx",
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS employee_full_name_trgm_idx ON employees_employee "
+        "USING gin (full_name gin_trgm_ops)",
+        "DROP INDEX IF EXISTS employee_full_name_trgm_idx",
+    ),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for create_sql, _ in SEARCH_INDEXES:
+        schema_editor.execute(create_sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for _, drop_sql in SEARCH_INDEXES:
+        schema_editor.execute(drop_sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0007_employee_tree_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['telegram_nick'], name='employee_telegram_nick_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
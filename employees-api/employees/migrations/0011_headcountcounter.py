@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:41
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    # Counters for the employees that already exist; from here on they are kept up to date.
+    # The city is taken from the location itself rather than the location_city copy.
+    Employee = apps.get_model("employees", "Employee")
+    HeadcountCounter = apps.get_model("employees", "HeadcountCounter")
+
+    fields = {"position": "position", "specialization": "specialization", "city": "location__city", "manager": "manager_id"}
+    for dimension, field in fields.items():
+        HeadcountCounter.objects.bulk_create([
+            HeadcountCounter(dimension=dimension, value="" if value is None else str(value), count=count)
+            for value, count in Employee.objects.values_list(field).annotate(count=Count("id")).order_by()
+        ], batch_size=300)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0010_employee_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HeadcountCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('position', 'Должность'), ('specialization', 'Специализация'), ('city', 'Город'), ('manager', 'Руководитель')], max_length=20, verbose_name='Разрез')),
+                ('value', models.CharField(blank=True, max_length=50, verbose_name='Значение')),
+                ('count', models.IntegerField(default=0, verbose_name='Сотрудников')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dimension', '-count'], name='headcount_dimension_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'value'), name='headcount_counter_unique')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('employees', '0011_headcountcounter'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='employee',
+            name='employee_tree_path_idx',
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='tree_path',
+            field=models.TextField(default='/', editable=False, verbose_name='Путь в оргструктуре'),
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['tree_path'], name='employee_tree_path_idx', opclasses=['text_pattern_ops']),
+        ),
+    ]
@@ -1,5 +1,12 @@
+import uuid
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Now, Substr
+from django.utils import timezone
 
 
 # Должность - Возможные варианты: Менеджер, Senior-разработчик, Middle-разработчик, Junior-разработчик
@@ -37,6 +44,42 @@ class Location(models.Model):
     def __str__(self):
         return f"{self.city}, {self.country}"
 
+    def save(self, *args, **kwargs):
+        from employees.headcount import record_city_rename
+
+        previous = None
+        if self.pk is not None:
+            previous = Location.objects.filter(pk=self.pk).values("city", "country").first()
+
+        super().save(*args, **kwargs)
+
+        # Keep the copies stored on employees in sync
+        if previous and (previous["city"], previous["country"]) != (self.city, self.country):
+            updated = Employee.objects.filter(location=self).update(
+                location_city=self.city,
+                location_label=str(self),
+                updated_at=timezone.now(),
+            )
+            if previous["city"] != self.city:
+                record_city_rename(previous["city"], self.city, updated)
+
+
+# "Иванов Иван Иванович" -> "Иванов И.И."
+def short_name(full_name):
+    parts = full_name.split()
+    return f"{parts[0]} {''.join(p[0] + '.' for p in parts[1:])}"
+
+
+# An id taken from a request (batch ids, keyset cursors): None unless it is a whole number that
+# fits the bigint primary key. Through str, so 1.5 and true are rejected instead of becoming 1;
+# outside bigint the id would fail in the database instead of here.
+def parse_id(value):
+    try:
+        pk = int(str(value).strip())
+    except ValueError:
+        return None
+    return pk if 1 <= pk < 2 ** 63 else None
+
 
 # Конкретный сотрудник - информацию о конкретном сотруднике
 class Employee(models.Model):
@@ -62,5 +105,254 @@ class Employee(models.Model):
         related_name="employee"
     )
 
+    # Денормализованные поля - копии данных руководителя и рабочего места, чтобы список
+    # читался из одной таблицы. Обновляются автоматически в save().
+    manager_short_name = models.CharField("Руководитель (кратко)", max_length=100, null=True, blank=True,
+                                          editable=False)
+    location_city = models.CharField("Город", max_length=50, blank=True, default="", editable=False)
+    location_label = models.CharField("Рабочее место (полностью)", max_length=102, blank=True, default="",
+                                      editable=False)
+
+    # Материализованный путь в оргструктуре - id всех руководителей сверху вниз: "/1/5/" у
+    # сотрудника, чей руководитель 5, а его руководитель 1. У корня "/".
+    tree_path = models.TextField("Путь в оргструктуре", default="/", editable=False)
+    tree_depth = models.PositiveSmallIntegerField("Уровень в оргструктуре", default=0, editable=False)
+
+    # Версия строки для ETag/Last-Modified. Массовые UPDATE отдаваемых API полей обновляют её явно, а вставки
+    # мимо ORM (COPY, INSERT ... SELECT) получают значение по умолчанию из базы.
+    updated_at = models.DateTimeField("Изменён", auto_now=True, db_default=Now())
+
+    class Meta:
+        indexes = [
+            # List ordering and keyset pagination: ORDER BY full_name, id
+            models.Index(fields=["full_name", "id"], name="employee_name_idx"),
+            # Every list filter followed by the ordering columns, so a filtered page is
+            # read in index order instead of being sorted
+            models.Index(fields=["position", "full_name", "id"], name="employee_position_name_idx"),
+            models.Index(fields=["specialization", "full_name", "id"], name="employee_spec_name_idx"),
+            models.Index(
+                fields=["position", "specialization", "full_name", "id"],
+                name="employee_pos_spec_name_idx",
+            ),
+            models.Index(fields=["location_city", "full_name", "id"], name="employee_city_name_idx"),
+            models.Index(fields=["manager", "full_name", "id"], name="employee_manager_name_idx"),
+            # Top of the org chart (employees without a manager)
+            models.Index(
+                fields=["full_name", "id"],
+                condition=models.Q(manager__isnull=True),
+                name="employee_root_name_idx",
+            ),
+            # Subtree lookups are prefix matches on the path (LIKE '/1/5/%')
+            models.Index(fields=["tree_path"], opclasses=["text_pattern_ops"], name="employee_tree_path_idx"),
+            # Admin search by nick prefix; the full-text and trigram indexes are PostgreSQL-only (migration 0008)
+            models.Index(fields=["telegram_nick"], opclasses=["varchar_pattern_ops"], name="employee_telegram_nick_idx"),
+        ]
+
     def __str__(self):
         return self.full_name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Values as loaded, to tell in save() what has actually changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_manager_short_name(self):
+        self.manager_short_name = short_name(self.manager.full_name) if self.manager_id else None
+
+    def refresh_location_label(self):
+        self.location_city = self.location.city
+        self.location_label = str(self.location)
+
+    def refresh_denormalized_fields(self):
+        self.refresh_manager_short_name()
+        self.refresh_location_label()
+
+    @property
+    def subtree_prefix(self):
+        # Every employee under this one has a tree_path starting with this prefix
+        return f"{self.tree_path}{self.pk}/"
+
+    def cycle_error(self):
+        return ValueError(f"Сотрудник {self.pk} не может подчиняться собственному подчинённому {self.manager_id}")
+
+    def get_tree_position(self):
+        # Path and depth the employee gets under its current manager
+        if not self.manager_id:
+            return "/", 0
+        manager_path, manager_depth = Employee.objects.filter(pk=self.manager_id).values_list(
+            "tree_path", "tree_depth"
+        ).get()
+        if self.pk is not None and (self.manager_id == self.pk or f"/{self.pk}/" in manager_path):
+            raise self.cycle_error()
+        return f"{manager_path}{self.manager_id}/", manager_depth + 1
+
+    def check_manager_cycle(self):
+        from employees.hierarchy import is_subordinate
+
+        if self.manager_id and (self.manager_id == self.pk or is_subordinate(self.manager_id, self.pk)):
+            raise self.cycle_error()
+
+    def refresh_tree_position(self):
+        # For objects that are about to be bulk-created under an already loaded manager
+        if self.manager_id:
+            self.tree_path = self.manager.subtree_prefix
+            self.tree_depth = self.manager.tree_depth + 1
+        else:
+            self.tree_path, self.tree_depth = "/", 0
+
+    def clean(self):
+        from employees.hierarchy import is_subordinate
+
+        if self.pk and self.manager_id and (self.manager_id == self.pk or is_subordinate(self.manager_id, self.pk)):
+            raise ValidationError({"manager": "Руководитель не может быть подчинённым этого сотрудника."})
+
+    def save(self, *args, **kwargs):
+        from employees.headcount import employee_groups, loaded_groups, record_change
+
+        loaded = getattr(self, "_loaded_values", {})
+        adding = self._state.adding
+        groups_before = None if adding else loaded_groups(self)
+        manager_changed = adding or loaded.get("manager_id") != self.manager_id
+        location_changed = adding or loaded.get("location_id") != self.location_id
+        renamed = not adding and loaded.get("full_name") != self.full_name
+
+        refreshed = set()
+        if manager_changed:
+            self.refresh_manager_short_name()
+            refreshed.add("manager_short_name")
+        if location_changed:
+            self.refresh_location_label()
+            refreshed.update(("location_city", "location_label"))
+
+        moved_from = None
+        if manager_changed and settings.EMPLOYEES_TREE_INDEX:
+            if not adding:
+                moved_from = Employee.objects.filter(pk=self.pk).values_list("tree_path", "tree_depth").first()
+            self.tree_path, self.tree_depth = self.get_tree_position()
+            refreshed.update(TREE_FIELDS)
+        elif manager_changed and not adding:
+            # Without the paths get_tree_position() is not called, so the cycle is looked for here
+            self.check_manager_cycle()
+
+        # The maintained columns are only written when this save refreshed them: the in-memory
+        # copies of an object loaded earlier may already be outdated (e.g. its manager was renamed)
+        if not adding:
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                skipped = set(MAINTAINED_FIELDS) - refreshed
+                kwargs["update_fields"] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in skipped
+                ]
+            else:
+                # auto_now is only written when it is listed
+                kwargs["update_fields"] = {*update_fields, *refreshed, "updated_at"}
+
+        super().save(*args, **kwargs)
+
+        record_change(groups_before, employee_groups(self))
+
+        # Subordinates keep a copy of the manager's short name
+        if renamed:
+            Employee.objects.filter(manager_id=self.pk).update(
+                manager_short_name=short_name(self.full_name),
+                updated_at=timezone.now(),
+            )
+
+        # The whole subtree moves together with the employee
+        if moved_from and moved_from != (self.tree_path, self.tree_depth):
+            old_path, old_depth = moved_from
+            old_prefix = f"{old_path}{self.pk}/"
+            Employee.objects.filter(tree_path__startswith=old_prefix).update(
+                tree_path=Concat(Value(self.subtree_prefix), Substr("tree_path", len(old_prefix) + 1)),
+                tree_depth=F("tree_depth") + (self.tree_depth - old_depth),
+            )
+
+        self._loaded_values = {
+            "full_name": self.full_name,
+            "position": self.position,
+            "specialization": self.specialization,
+            "manager_id": self.manager_id,
+            "location_id": self.location_id,
+            "location_city": self.location_city,
+            "user_id": self.user_id,
+        }
+
+
+DENORMALIZED_FIELDS = ("manager_short_name", "location_city", "location_label")
+TREE_FIELDS = ("tree_path", "tree_depth")
+MAINTAINED_FIELDS = DENORMALIZED_FIELDS + TREE_FIELDS
+
+
+# Разрез численности сотрудников
+class HeadcountDimension(models.TextChoices):
+    POSITION = "position", "Должность"
+    SPECIALIZATION = "specialization", "Специализация"
+    CITY = "city", "Город"
+    MANAGER = "manager", "Руководитель"
+
+
+# Численность сотрудников в группе (например, должность "Менеджер" или руководитель с id 5).
+# Меняется на разницу при каждом создании, изменении и удалении сотрудника (employees.headcount),
+# пересчитывается командой reconcile_headcount_stats.
+class HeadcountCounter(models.Model):
+    dimension = models.CharField("Разрез", max_length=20, choices=HeadcountDimension.choices)
+    value = models.CharField("Значение", max_length=50, blank=True)
+    count = models.IntegerField("Сотрудников", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "value"], name="headcount_counter_unique"),
+        ]
+        indexes = [
+            # Biggest groups of a dimension first
+            models.Index(fields=["dimension", "-count"], name="headcount_dimension_count_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}={self.value}: {self.count}"
+
+
+# Статус фоновой загрузки сотрудников из CSV
+class ImportStatus(models.TextChoices):
+    PENDING = "pending", "В очереди"
+    RUNNING = "running", "Выполняется"
+    SUCCEEDED = "succeeded", "Завершена"
+    FAILED = "failed", "Завершена с ошибками"
+
+
+# Режим загрузки: только добавление или добавление с обновлением сотрудников, найденных по нику
+class ImportMode(models.TextChoices):
+    INSERT = "insert", "Добавление"
+    UPSERT = "upsert", "Добавление и обновление"
+
+
+# Фоновая загрузка - файл, прогресс и результат обработки
+class ImportJob(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField("Файл", upload_to="imports/")
+    status = models.CharField("Статус", max_length=20, choices=ImportStatus.choices, default=ImportStatus.PENDING)
+    mode = models.CharField("Режим", max_length=20, choices=ImportMode.choices, default=ImportMode.INSERT)
+    manager = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="Руководитель"
+    )
+    total_bytes = models.PositiveBigIntegerField("Размер файла", default=0)
+    bytes_processed = models.PositiveBigIntegerField("Обработано байт", default=0)
+    rows_processed = models.PositiveIntegerField("Обработано строк", default=0)
+    created_count = models.PositiveIntegerField("Создано сотрудников", default=0)
+    updated_count = models.PositiveIntegerField("Обновлено сотрудников", default=0)
+    unchanged_count = models.PositiveIntegerField("Без изменений", default=0)
+    errors = models.JSONField("Ошибки", default=list, blank=True)
+    created_at = models.DateTimeField("Создана", auto_now_add=True)
+    started_at = models.DateTimeField("Начата", null=True, blank=True)
+    finished_at = models.DateTimeField("Завершена", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
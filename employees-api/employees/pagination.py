@@ -0,0 +1,110 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from employees.models import parse_id
+
+
+class EmployeePagination(PageNumberPagination):
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class EmployeeKeysetPagination(BasePagination):
+    # Keyset pagination over (full_name, id): every page is an index range scan that starts
+    # right after the last row of the previous page, so deep pages cost the same as the first one.
+    cursor_query_param = "cursor"
+    page_size = 5
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    count_query_param = "count"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self.get_include_count(request) else None
+
+        queryset = self.filter_after(queryset, self.decode_cursor(request))
+        return self.cut_page(list(queryset[:self.page_size + 1]))
+
+    def filter_after(self, queryset, position):
+        if position is not None:
+            full_name, pk = position
+            queryset = queryset.filter(full_name__gte=full_name).filter(
+                Q(full_name__gt=full_name) | Q(full_name=full_name, id__gt=pk)
+            )
+        return queryset.order_by("full_name", "id")
+
+    def cut_page(self, results):
+        # One row more than the page size is fetched to know whether there is a next page
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = self.get_position(results[-1]) if self.has_next else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_include_count(self, request):
+        return request.query_params.get(self.count_query_param, "true").lower() not in ("0", "false", "no")
+
+    def get_position(self, item):
+        if isinstance(item, dict):
+            return item["full_name"], item["id"]
+        return item.full_name, item.id
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            full_name, pk = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        except (binascii.Error, UnicodeError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        pk = parse_id(pk)
+        if pk is None:
+            raise NotFound(self.invalid_cursor_message)
+        return str(full_name), pk
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(json.dumps(position, ensure_ascii=False).encode("utf-8"))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode("ascii"))
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload["count"] = self.count
+        payload["next"] = self.get_next_link()
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["next", "results"],
+            "properties": {
+                "count": {"type": "integer"},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
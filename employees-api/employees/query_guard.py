@@ -0,0 +1,77 @@
+import logging
+import re
+
+from django.conf import settings
+
+# Development/test guard against N+1 queries. With EMPLOYEES_QUERY_GUARD set to "warn" or
+# "raise" every request counts its queries by shape (the SQL with its parameters left out)
+# and is checked against the query budget its view declares:
+#
+#     class EmployeeDetailView(RetrieveAPIView):
+#         query_budget = 1
+#
+# Function views declare it with the @query_budget decorator. The same shape running more than
+# EMPLOYEES_QUERY_GUARD_MAX_REPEATS times is reported as well, budget or not, unless the view
+# sets query_max_repeats = None.
+
+logger = logging.getLogger("employees")
+
+GUARD_OFF = "off"
+GUARD_WARN = "warn"
+GUARD_RAISE = "raise"
+
+IN_LIST_RE = re.compile(r"IN \((?:%s, )*%s\)")
+VALUES_LIST_RE = re.compile(r"VALUES (?:\((?:%s, )*%s\)(?:, )?)+")
+NUMBER_RE = re.compile(r"\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    # IN lists and multi-row VALUES differ in length only; literal numbers (LIMIT, OFFSET) are dropped
+    sql = IN_LIST_RE.sub("IN (...)", sql)
+    sql = VALUES_LIST_RE.sub("VALUES (...)", sql)
+    return NUMBER_RE.sub("?", sql)
+
+
+def query_budget(budget):
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def get_view_limits(request):
+    match = request.resolver_match
+    view = getattr(match.func, "view_class", match.func) if match else None
+    budget = getattr(view, "query_budget", None)
+    max_repeats = getattr(view, "query_max_repeats", settings.EMPLOYEES_QUERY_GUARD_MAX_REPEATS)
+    return budget, max_repeats
+
+
+def find_problems(request, queries):
+    budget, max_repeats = get_view_limits(request)
+    problems = []
+    if budget is not None and queries.count > budget:
+        problems.append(f"{queries.count} запросов при бюджете {budget}")
+    if max_repeats is not None:
+        for shape, count in queries.shapes.most_common():
+            if count <= max_repeats:
+                break
+            problems.append(f"{count} одинаковых запросов: {shape}")
+    return problems
+
+
+def check_queries(request, queries):
+    mode = settings.EMPLOYEES_QUERY_GUARD
+    if mode == GUARD_OFF:
+        return
+    problems = find_problems(request, queries)
+    if not problems:
+        return
+    message = f"{request.method} {request.get_full_path()}: " + "; ".join(problems)
+    if mode == GUARD_RAISE:
+        raise QueryBudgetExceeded(message)
+    logger.warning("[QUERY GUARD] %s", message)
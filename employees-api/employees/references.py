@@ -0,0 +1,61 @@
+import threading
+
+from django.db import transaction
+
+from employees.cache import bump_version, get_version
+from employees.models import City, Country, Location, Position, Specialization
+
+# Reference data looked up on every created or imported employee. The choice enums are
+# fixed at import time; locations are read once per process and reloaded when the shared
+# version (bumped on every Location save) changes, so validation needs no queries.
+
+LOCATIONS_VERSION_KEY = "employees:locations:version"
+
+
+class ChoiceLookup:
+    def __init__(self, choices, normalize):
+        self.normalize = normalize
+        self.values = [value for value, _ in choices]
+        self.lookup = {normalize(value): value for value in self.values}
+
+    def get(self, value):
+        return self.lookup.get(self.normalize(value.strip()))
+
+
+POSITIONS = ChoiceLookup(Position.choices, str.lower)
+SPECIALIZATIONS = ChoiceLookup(Specialization.choices, str.lower)
+CITIES = ChoiceLookup(City.choices, str.title)
+COUNTRIES = ChoiceLookup(Country.choices, str.title)
+
+
+class LocationCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.locations = {}
+
+    def get_all(self):
+        version = get_version(LOCATIONS_VERSION_KEY)
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.locations = {(location.city, location.country): location for location in Location.objects.all()}
+                    self.version = version
+        return self.locations
+
+
+location_cache = LocationCache()
+
+
+def get_locations():
+    # {(city, country): Location}; the instances are shared, so they must not be modified
+    return location_cache.get_all()
+
+
+def get_location(city, country):
+    return get_locations().get((city, country))
+
+
+def invalidate_locations():
+    # After commit, as with the cached lists: a reload before that would read the old rows
+    transaction.on_commit(lambda: bump_version(LOCATIONS_VERSION_KEY))
@@ -0,0 +1,47 @@
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from employees.exporters import stream_csv, stream_ndjson
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Same output as JSONRenderer, but compact responses are encoded with orjson when it is installed
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=JSONEncoder().default)
+        # Same escaping as JSONRenderer: keep the output a strict javascript subset
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class StreamingExportRenderer(BaseRenderer):
+    # Export formats. EmployeeExportView sends stream(queryset) piece by piece;
+    # render() builds the same file in one piece
+    charset = "utf-8"
+    stream = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return "".join(self.stream(data)).encode(self.charset)
+
+
+class CSVRenderer(StreamingExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    stream = staticmethod(stream_csv)
+
+
+class NDJSONRenderer(StreamingExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    stream = staticmethod(stream_ndjson)
@@ -0,0 +1,140 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from employees.cache import get_generation
+from employees.fast_serializers import LIST_FIELDS, serialize_list_rows
+from employees.models import Employee
+
+# Employee search over full_name and about. On PostgreSQL it is full-text search
+# (russian config, prefix terms) plus trigram word similarity on full_name for typos,
+# both served by GIN indexes (migration 0008). Elsewhere a small in-process inverted
+# index is used instead.
+
+TABLE = Employee._meta.db_table
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', e.full_name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(e.about, '')), 'B')"
+)
+
+MATCH_SQL = f"({SEARCH_VECTOR}) @@ to_tsquery('russian', %s) OR %s <%% e.full_name"
+
+SEARCH_SQL = f"""
+SELECT e.id, ts_rank({SEARCH_VECTOR}, to_tsquery('russian', %s)) + word_similarity(%s, e.full_name) AS rank
+FROM {TABLE} e
+WHERE {MATCH_SQL}
+ORDER BY rank DESC, e.full_name, e.id
+LIMIT %s
+"""
+
+WORD_RE = re.compile(r"\w+")
+
+
+def get_terms(text):
+    return [word.replace("ё", "е") for word in WORD_RE.findall(text.lower())]
+
+
+def to_tsquery(terms):
+    # Every word is a prefix, all of them must match: "ива пет" -> "ива:* & пет:*"
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def use_postgres():
+    return connection.vendor == "postgresql"
+
+
+class InvertedIndex:
+    # In-process fallback: token -> {employee id: weight}, a name token weighs more than one from "about".
+    # Terms are matched as prefixes of tokens and all of them must match, like the tsquery above.
+    NAME_WEIGHT = 2.0
+    ABOUT_WEIGHT = 1.0
+
+    def __init__(self, rows):
+        self.postings = defaultdict(dict)
+        for pk, full_name, about in rows:
+            for weight, text in ((self.ABOUT_WEIGHT, about or ""), (self.NAME_WEIGHT, full_name)):
+                for token in get_terms(text):
+                    postings = self.postings[token]
+                    postings[pk] = max(postings.get(pk, 0), weight)
+        self.tokens = sorted(self.postings)
+
+    def match_term(self, term):
+        scores = {}
+        start = bisect_left(self.tokens, term)
+        for token in self.tokens[start:]:
+            if not token.startswith(term):
+                break
+            # A whole word counts a bit more than a prefix of a longer one
+            bonus = 0.5 if token == term else 0
+            for pk, weight in self.postings[token].items():
+                scores[pk] = max(scores.get(pk, 0), weight + bonus)
+        return scores
+
+    def search(self, terms, limit=None):
+        scores = None
+        for term in terms:
+            matched = self.match_term(term)
+            if scores is None:
+                scores = matched
+            else:
+                scores = {pk: score + matched[pk] for pk, score in scores.items() if pk in matched}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        return ranked[:limit] if limit is not None else ranked
+
+
+_index = None
+_index_generation = None
+_index_lock = threading.Lock()
+
+
+def get_inverted_index():
+    # Rebuilt whenever the employee list cache generation changes, i.e. after any change to employees
+    global _index, _index_generation
+    generation = get_generation()
+    with _index_lock:
+        if _index is None or _index_generation != generation:
+            rows = Employee.objects.values_list("id", "full_name", "about").iterator(chunk_size=10_000)
+            _index = InvertedIndex(rows)
+            _index_generation = generation
+        return _index
+
+
+def search_ids(query, limit):
+    # [(employee id, rank)], best match first
+    terms = get_terms(query)
+    if not terms:
+        return []
+    if use_postgres():
+        tsquery = to_tsquery(terms)
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_SQL, [tsquery, query, tsquery, query, limit])
+            return cursor.fetchall()
+    return get_inverted_index().search(terms, limit)
+
+
+def search_employees(query, limit):
+    ranked = search_ids(query, limit)
+    rows = {row["id"]: row for row in Employee.objects.filter(pk__in=[pk for pk, _ in ranked]).values(*LIST_FIELDS)}
+    # An employee may have been deleted since the search
+    ranked = [(pk, rank) for pk, rank in ranked if pk in rows]
+    results = serialize_list_rows([rows[pk] for pk, _ in ranked])
+    for result, (_, rank) in zip(results, ranked):
+        result["rank"] = round(rank, 4)
+    return results
+
+
+def filter_by_search(queryset, query):
+    # All matches, for the admin changelist (it paginates and orders by itself)
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+    if use_postgres():
+        return queryset.filter(pk__in=RawSQL(f"SELECT e.id FROM {TABLE} e WHERE {MATCH_SQL}", [to_tsquery(terms), query]))
+    return queryset.filter(pk__in=[pk for pk, _ in get_inverted_index().search(terms)])
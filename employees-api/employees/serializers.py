@@ -2,21 +2,15 @@ import logging
 
 from rest_framework import serializers
 
-from employees.models import (
-    Employee,
-    Position,
-    Specialization,
-    Location,
-    City,
-    Country,
-)
+from employees.models import Employee, ImportJob
+from employees.references import CITIES, COUNTRIES, POSITIONS, SPECIALIZATIONS, get_location
 
 logger = logging.getLogger("employees")
 
 
 class EmployeeListSerializer(serializers.ModelSerializer):
-    manager_name = serializers.SerializerMethodField()
-    city = serializers.CharField(source="location.city")
+    manager_name = serializers.CharField(source="manager_short_name", read_only=True)
+    city = serializers.CharField(source="location_city", read_only=True)
 
     class Meta:
         model = Employee
@@ -29,17 +23,11 @@ class EmployeeListSerializer(serializers.ModelSerializer):
             "manager_name",
         ]
 
-    def get_manager_name(self, obj):
-        if obj.manager:
-            parts = obj.manager.full_name.split()
-            return f"{parts[0]} {''.join(p[0] + '.' for p in parts[1:])}"
-        return None
-
 
 class EmployeeDetailSerializer(serializers.ModelSerializer):
     manager_id = serializers.IntegerField(source='manager.id', read_only=True)
     manager_full_name = serializers.CharField(source='manager.full_name', read_only=True)
-    location_full = serializers.SerializerMethodField()
+    location_full = serializers.CharField(source="location_label", read_only=True)
 
     class Meta:
         model = Employee
@@ -55,9 +43,6 @@ class EmployeeDetailSerializer(serializers.ModelSerializer):
             "about",
         ]
 
-    def get_location_full(self, obj):
-        return f"{obj.location.city}, {obj.location.country}"
-
 
 class EmployeeCreateSerializer(serializers.ModelSerializer):
     city = serializers.CharField(write_only=True)
@@ -89,52 +74,47 @@ class EmployeeCreateSerializer(serializers.ModelSerializer):
         return value
 
     def validate_position(self, value):
-        value_cleaned = value.strip().lower()
-        for internal_value, _ in Position.choices:
-            if internal_value.lower() == value_cleaned:
-                return internal_value
-        raise serializers.ValidationError(
-            f"Недопустимая должность: {value}. Допустимые значения: {[val for val, _ in Position.choices]}"
-        )
+        position = POSITIONS.get(value)
+        if position is None:
+            raise serializers.ValidationError(
+                f"Недопустимая должность: {value}. Допустимые значения: {POSITIONS.values}"
+            )
+        return position
 
     def validate_specialization(self, value):
-        value_cleaned = value.strip().lower()
-        for internal_value, _ in Specialization.choices:
-            if internal_value.lower() == value_cleaned:
-                return internal_value
-        raise serializers.ValidationError(
-            f"Недопустимая специализация: {value}. Допустимые: {[val for val, _ in Specialization.choices]}"
-        )
+        specialization = SPECIALIZATIONS.get(value)
+        if specialization is None:
+            raise serializers.ValidationError(
+                f"Недопустимая специализация: {value}. Допустимые: {SPECIALIZATIONS.values}"
+            )
+        return specialization
 
     def validate_city(self, value):
-        value_cleaned = value.strip().title()
-        allowed = [c for c, _ in City.choices]
-        if value_cleaned not in allowed:
+        city = CITIES.get(value)
+        if city is None:
             raise serializers.ValidationError(
-                f"Недопустимый город: {value}. Допустимые значения: {allowed}"
+                f"Недопустимый город: {value}. Допустимые значения: {CITIES.values}"
             )
-        return value_cleaned
+        return city
 
     def validate_country(self, value):
-        value_cleaned = value.strip().title()
-        allowed = [c for c, _ in Country.choices]
-        if value_cleaned not in allowed:
+        country = COUNTRIES.get(value)
+        if country is None:
             raise serializers.ValidationError(
-                f"Недопустимая страна: {value}. Допустимые значения: {allowed}"
+                f"Недопустимая страна: {value}. Допустимые значения: {COUNTRIES.values}"
             )
-        return value_cleaned
+        return country
 
     def create(self, validated_data):
         city = validated_data.pop("city")
         country = validated_data.pop("country")
         manager = validated_data.pop("manager", None)
 
-        logger.debug(f"[CREATE INPUT] Попытка создания сотрудника: {validated_data}, город: {city}, страна: {country}")
+        logger.debug("[CREATE INPUT] Попытка создания сотрудника: %s, город: %s, страна: %s", validated_data, city, country)
 
-        try:
-            location = Location.objects.get(city=city, country=country)
-        except Location.DoesNotExist:
-            logger.warning(f"[CREATE] Локация не найдена: {city}, {country}")
+        location = get_location(city, country)
+        if location is None:
+            logger.warning("[CREATE] Локация не найдена: %s, %s", city, country)
             raise serializers.ValidationError({
                 "location": f"Локация '{city}, {country}' не найдена в системе."
             })
@@ -145,5 +125,25 @@ class EmployeeCreateSerializer(serializers.ModelSerializer):
             **validated_data
             )
 
-        logger.info(f"[CREATE] Сотрудник создан: {employee.full_name} (id={employee.id})")
+        logger.info("[CREATE] Сотрудник создан: %s (id=%s)", employee.full_name, employee.id)
         return employee
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "status",
+            "mode",
+            "total_bytes",
+            "bytes_processed",
+            "rows_processed",
+            "created_count",
+            "updated_count",
+            "unchanged_count",
+            "errors",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from employees.authentication import invalidate_cached_tokens
+from employees.cache import invalidate_employee_lists
+from employees.headcount import record_delete, record_detached_subordinates
+from employees.metrics import record_query
+from employees.models import Employee, Location
+from employees.references import invalidate_locations
+from employees.tree import detach_subtree
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_cached_lists(sender, **kwargs):
+    invalidate_employee_lists()
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_cached_locations(sender, **kwargs):
+    invalidate_locations()
+
+
+@receiver(pre_delete, sender=Employee)
+def clear_manager_short_name(sender, instance, **kwargs):
+    # on_delete=SET_NULL updates subordinates without calling save(), so their copy
+    # of the manager's name is cleared here, in the same transaction
+    Employee.objects.filter(manager_id=instance.pk).update(manager_short_name=None, updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Employee)
+def count_deleted_employee(sender, instance, **kwargs):
+    # Before SET_NULL, while the subordinates still point at the employee
+    record_delete(instance)
+
+
+@receiver(post_delete, sender=Employee)
+def count_detached_subordinates(sender, instance, **kwargs):
+    # After the whole collection is deleted, so subordinates deleted along with the employee are skipped
+    record_detached_subordinates(instance)
+
+
+@receiver(pre_delete, sender=Employee)
+def detach_tree_path(sender, instance, **kwargs):
+    if settings.EMPLOYEES_TREE_INDEX:
+        detach_subtree(instance)
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_tokens(sender, **kwargs):
+    # Deactivated users, changed permissions and deleted tokens must not be served from the cache
+    invalidate_cached_tokens()
+
+
+@receiver(pre_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def invalidate_employee_tokens(sender, instance, **kwargs):
+    # Cached users carry their employee; the previous owner of the employee is in the loaded values
+    loaded = getattr(instance, "_loaded_values", {})
+    if instance.user_id is not None or loaded.get("user_id") is not None:
+        invalidate_cached_tokens()
+
+
+@receiver(connection_created)
+def install_query_stats(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
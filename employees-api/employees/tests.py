@@ -1,3 +1,1506 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import logging
+import os
+import tempfile
+from collections import Counter
+from unittest import mock
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from com_hr_example import urls as project_urls
+from employees.cache import get_cache, get_generation
+from employees.generators import COLUMNS
+from employees.headcount import reconcile
+from employees.hierarchy import get_ancestors, get_headcount, get_subtree
+from employees.importers import get_importer
+from employees.jobs import process_import_job
+from employees.log_queue import BufferedFileHandler, SamplingFilter
+from employees.metrics import QueryStats, RequestMetrics, current_queries
+from employees.models import DENORMALIZED_FIELDS, Employee, HeadcountCounter, ImportJob, Location, short_name
+from employees.query_guard import QueryBudgetExceeded, check_queries, fingerprint, get_view_limits
+from employees.references import get_location, get_locations
+from employees.renderers import CSVRenderer, NDJSONRenderer
+from employees.serializers import EmployeeCreateSerializer
+from employees.search import InvertedIndex
+from employees.tree import find_broken_nodes, rebuild_tree
+from employees.views import EmployeeDetailView, EmployeeExportView
+
+# Every endpoint is requested with the N+1 guard in "raise" mode: a request that runs more
+# queries than its view's query_budget, or repeats one query shape, fails the test.
+# Pages are requested big enough that a per-row query would show up.
+
+PAGE_SIZE = 50
+
+
+def iter_patterns(patterns, prefix=""):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern
+
+
+@override_settings(EMPLOYEES_QUERY_GUARD="raise", EMPLOYEES_QUERY_GUARD_MAX_REPEATS=3)
+class EmployeeQueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=200, seed=1, stdout=io.StringIO())
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        cls.token = Token.objects.create(user=cls.user)
+        cls.manager = Employee.objects.filter(manager__isnull=True, subordinates__isnull=False).first()
+        cls.employee = Employee.objects.filter(tree_depth__gte=2).order_by("-tree_depth", "id").first()
+
+    def setUp(self):
+        # Cached list pages would hide the queries behind them
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, None if response.streaming else response.content)
+        return response
+
+    def test_every_endpoint_declares_budget(self):
+        for route, pattern in iter_patterns(project_urls.urlpatterns):
+            if not route.startswith(("api/v1/employees/", "metrics")):
+                continue
+            view = getattr(pattern.callback, "view_class", pattern.callback)
+            with self.subTest(route=route):
+                self.assertIsNotNone(getattr(view, "query_budget", None))
+
+    def test_list(self):
+        response = self.get("/api/v1/employees/", {"page_size": PAGE_SIZE})
+        self.assertEqual(len(response.json()["results"]), PAGE_SIZE)
+        self.get("/api/v1/employees/", {"page_size": PAGE_SIZE, "page": 2})
+
+    def test_list_filtered(self):
+        self.get("/api/v1/employees/", {"page_size": PAGE_SIZE, "manager": self.manager.pk})
+        self.get("/api/v1/employees/", {"page_size": PAGE_SIZE, "position": "Менеджер"})
+
+    def test_list_keyset(self):
+        response = self.get("/api/v1/employees/", {"page_size": PAGE_SIZE, "cursor": ""})
+        self.get(response.json()["next"])
+
+    def test_list_cached(self):
+        self.get("/api/v1/employees/", {"page_size": PAGE_SIZE})
+        response = self.get("/api/v1/employees/", {"page_size": PAGE_SIZE})
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_cache_stats(self):
+        self.get("/api/v1/employees/cache-stats/")
+
+    def test_async_list(self):
+        self.get("/api/v1/employees/async/", {"page_size": PAGE_SIZE})
+        self.get("/api/v1/employees/async/", {"page_size": PAGE_SIZE, "cursor": ""})
+
+    def test_async_detail(self):
+        self.get(f"/api/v1/employees/async/{self.employee.pk}/")
+
+    def test_export(self):
+        # The rows are streamed after the middleware has finished, so the whole response is counted here
+        for export_format in ("csv", "ndjson"):
+            with self.subTest(format=export_format), CaptureQueriesContext(connection) as queries:
+                response = self.get("/api/v1/employees/export/", {"format": export_format})
+                b"".join(response.streaming_content)
+            self.assertLessEqual(len(queries), EmployeeExportView.query_budget)
+
+    def test_search(self):
+        self.get("/api/v1/employees/search/", {"q": self.employee.full_name.split()[0], "limit": PAGE_SIZE})
+
+    def test_detail(self):
+        self.get(f"/api/v1/employees/{self.employee.pk}/")
+
+    def test_batch(self):
+        ids = list(Employee.objects.order_by("-id").values_list("id", flat=True)[:PAGE_SIZE])
+        missing = max(ids) + 1
+        response = self.get("/api/v1/employees/batch/", {"ids": ",".join(map(str, [missing, *ids]))})
+        self.assertEqual([employee["id"] for employee in response.json()["results"]], ids)
+        self.assertEqual(response.json()["missing"], [missing])
+
+        response = self.client.post("/api/v1/employees/batch/", {"ids": ids[:3]}, format="json")
+        self.assertEqual(response.json()["results"], [self.get(f"/api/v1/employees/{pk}/").json() for pk in ids[:3]])
+
+        for bad in (1.5, "x", 0, -1, 2 ** 63, 99999999999999999999):
+            with self.subTest(id=bad):
+                response = self.client.post("/api/v1/employees/batch/", {"ids": [bad]}, format="json")
+                self.assertEqual(response.json(), {"ids": f"Неверный id: {bad}."})
+                response = self.client.get("/api/v1/employees/batch/", {"ids": f"1,{bad}"})
+                self.assertEqual(response.status_code, 400)
+
+    def test_stats(self):
+        response = self.get("/api/v1/employees/stats/", {"limit": PAGE_SIZE})
+        self.assertEqual(response.json()["total"], Employee.objects.count())
+
+    def test_hierarchy(self):
+        self.get(f"/api/v1/employees/{self.manager.pk}/subtree/")
+        self.get(f"/api/v1/employees/{self.employee.pk}/ancestors/")
+        self.get(f"/api/v1/employees/{self.manager.pk}/headcount/")
+        self.get(f"/api/v1/employees/{self.employee.pk}/reports-to/{self.manager.pk}/")
+
+    def test_create(self):
+        # Locations are loaded once per process, not per request
+        get_locations()
+        response = self.client.post("/api/v1/employees/create/", {
+            "full_name": "Петров Пётр Петрович",
+            "position": "Junior-разработчик",
+            "specialization": "Python",
+            "city": "Москва",
+            "country": "Россия",
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_upload(self):
+        lines = ["full_name,position,specialization,city,country,telegram_nick,about"]
+        lines += [f"Сидоров Сидор {index},Junior-разработчик,Python,Москва,Россия,@sidorov{index}," for index in range(PAGE_SIZE)]
+        file = SimpleUploadedFile("employees.csv", "\n".join(lines).encode("utf-8"), content_type="text/csv")
+        response = self.client.post("/api/v1/employees/upload/", {"file": file}, format="multipart")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["created_count"], PAGE_SIZE)
+
+    def test_upload_job(self):
+        job = ImportJob.objects.create(file="imports/employees.csv")
+        self.get(f"/api/v1/employees/upload/{job.pk}/")
+
+    @override_settings(EMPLOYEES_METRICS_TOKEN="scrape-token")
+    def test_metrics(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.get("/metrics")
+        self.client.credentials()
+        self.client.force_login(self.user)
+        self.get("/metrics")
+
+    def test_budget_exceeded(self):
+        with mock.patch.object(EmployeeDetailView, "query_budget", 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(f"/api/v1/employees/{self.employee.pk}/")
+
+
+class QueryGuardTests(TestCase):
+    def test_fingerprint_ignores_list_lengths_and_numbers(self):
+        self.assertEqual(
+            fingerprint('SELECT "id" FROM "t" WHERE "id" IN (%s, %s, %s) LIMIT 21'),
+            fingerprint('SELECT "id" FROM "t" WHERE "id" IN (%s) LIMIT 5'),
+        )
+        self.assertEqual(
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'),
+            fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s)'),
+        )
+
+    @override_settings(EMPLOYEES_QUERY_GUARD="raise", EMPLOYEES_QUERY_GUARD_MAX_REPEATS=3)
+    def test_repeated_queries_are_reported(self):
+        call_command("populate_employees", count=20, seed=1, stdout=io.StringIO())
+        request = RequestFactory().get("/api/v1/employees/")
+        request.resolver_match = None
+
+        queries = QueryStats(fingerprint=fingerprint)
+        token = current_queries.set(queries)
+        try:
+            for employee in Employee.objects.filter(manager__isnull=False)[:10]:
+                employee.manager.full_name
+        finally:
+            current_queries.reset(token)
+
+        self.assertEqual(queries.count, 11)
+        with self.assertRaisesMessage(QueryBudgetExceeded, "10 одинаковых запросов"):
+            check_queries(request, queries)
+
+    @override_settings(EMPLOYEES_QUERY_GUARD_MAX_REPEATS=3)
+    def test_view_limits(self):
+        request = RequestFactory().get("/")
+        request.resolver_match = None
+        self.assertEqual(get_view_limits(request), (None, 3))
+
+
+class ReferenceCacheTests(TestCase):
+    def test_validation_runs_no_queries(self):
+        data = {
+            "full_name": "Петров Пётр Петрович",
+            "position": "Junior-разработчик",
+            "specialization": "Python",
+            "city": "москва",
+            "country": "россия",
+        }
+        get_location("Москва", "Россия")
+        with self.assertNumQueries(0):
+            serializer = EmployeeCreateSerializer(data=data)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            self.assertIsNotNone(get_location(serializer.validated_data["city"], serializer.validated_data["country"]))
+        self.assertEqual(serializer.validated_data["city"], "Москва")
+
+    def test_location_save_reloads_locations(self):
+        location = Location.objects.get(city="Париж")
+        self.assertEqual(get_location("Париж", "Франция").pk, location.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            location.country = "Россия"
+            location.save()
+        self.assertIsNone(get_location("Париж", "Франция"))
+        self.assertEqual(get_location("Париж", "Россия").pk, location.pk)
+
+
+class SamplingFilterTests(SimpleTestCase):
+    def record(self, level):
+        return logging.LogRecord("employees.upload.rows", level, __file__, 1, "[UPLOAD] Сотрудник создан", None, None)
+
+    def passed(self, sampling, level, count):
+        return sum(sampling.filter(self.record(level)) for _ in range(count))
+
+    def test_rate(self):
+        self.assertEqual(self.passed(SamplingFilter(rate=10), logging.INFO, 100), 10)
+        self.assertEqual(self.passed(SamplingFilter(rate=1), logging.INFO, 100), 100)
+        # Nonsense rates keep everything
+        self.assertEqual(self.passed(SamplingFilter(rate=0), logging.INFO, 100), 100)
+
+    def test_warnings_always_pass(self):
+        sampling = SamplingFilter(rate=10)
+        self.assertEqual(self.passed(sampling, logging.WARNING, 20), 20)
+        self.assertEqual(self.passed(sampling, logging.ERROR, 20), 20)
+
+    def test_configured(self):
+        filters = logging.getLogger("employees.upload.rows").filters
+        self.assertEqual([type(sampling) for sampling in filters], [SamplingFilter])
+
+
+class LogQueueTests(SimpleTestCase):
+    def test_configured(self):
+        # Loggers only enqueue; the listener thread writes to the real handlers
+        handler = logging.getHandlerByName("queue")
+        self.assertEqual(logging.getLogger("employees").handlers, [handler])
+        self.assertEqual(
+            [type(target) for target in handler.listener.handlers],
+            [logging.StreamHandler, BufferedFileHandler, BufferedFileHandler],
+        )
+
+    def test_buffered_file_handler(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "all.log")
+            handler = BufferedFileHandler(path, batch_size=3, flush_interval=60)
+            logger = logging.getLogger("employees.tests.buffered")
+            logger.propagate = False
+            logger.addHandler(handler)
+            self.addCleanup(logger.removeHandler, handler)
+
+            def written():
+                with open(path, encoding="utf-8") as file:
+                    return file.read().splitlines()
+
+            logger.warning("первая")
+            logger.warning("вторая")
+            self.assertEqual(written(), [])
+            logger.warning("третья")
+            self.assertEqual(written(), ["первая", "вторая", "третья"])
+            # Errors do not wait for the batch
+            logger.error("ошибка")
+            self.assertEqual(written()[-1], "ошибка")
+            logger.warning("последняя")
+            handler.close()
+            self.assertEqual(written()[-1], "последняя")
+            self.assertIsNone(handler.timer)
+
+    def test_buffered_file_handler_interval(self):
+        # A batch that never fills up is written out by the timer, without waiting for more records
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "all.log")
+            handler = BufferedFileHandler(path, batch_size=100, flush_interval=0.05)
+            self.addCleanup(handler.close)
+            handler.handle(logging.makeLogRecord({"msg": "одна", "levelno": logging.INFO}))
+            timer = handler.timer
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(file.read(), "")
+            timer.join(5)
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(file.read().splitlines(), ["одна"])
+            self.assertIsNone(handler.timer)
+
+
+class RequestMetricsTests(TestCase):
+    def test_server_timing(self):
+        response = APIClient().get("/api/v1/employees/")
+        timings = dict(part.strip().split(";dur=") for part in response["Server-Timing"].split(","))
+        self.assertEqual(list(timings), ["db", "app", "total"])
+        db, app, total = map(float, timings.values())
+        self.assertAlmostEqual(db + app, total, delta=0.2)
+
+    def test_render(self):
+        metrics = RequestMetrics()
+        metrics.observe("api/v1/employees/", "GET", 200, 0.02, 3, 0.004, 100)
+        metrics.observe("api/v1/employees/", "GET", 200, 0.3, 5, 0.1, 300)
+        metrics.observe("api/v1/employees/", "GET", 200, 60, 1, 0.5, None)
+        metrics.observe('a"b\\c', "POST", 400, 0.001, 0, 0, 10)
+        lines = metrics.render().splitlines()
+
+        labels = 'endpoint="api/v1/employees/",method="GET",status="200"'
+        buckets = [line for line in lines if line.startswith(f"employees_http_request_duration_seconds_bucket{{{labels}")]
+        self.assertEqual(len(buckets), 12)
+        # Cumulative, and a request slower than the last bound only counts in +Inf
+        self.assertIn(f'employees_http_request_duration_seconds_bucket{{{labels},le="0.01"}} 0', buckets)
+        self.assertIn(f'employees_http_request_duration_seconds_bucket{{{labels},le="0.025"}} 1', buckets)
+        self.assertIn(f'employees_http_request_duration_seconds_bucket{{{labels},le="0.5"}} 2', buckets)
+        self.assertIn(f'employees_http_request_duration_seconds_bucket{{{labels},le="10.0"}} 2', buckets)
+        self.assertIn(f'employees_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3', buckets)
+        self.assertIn(f"employees_http_request_duration_seconds_count{{{labels}}} 3", lines)
+        self.assertIn(f"employees_http_db_queries_total{{{labels}}} 9", lines)
+        self.assertIn(f"employees_http_response_bytes_total{{{labels}}} 400", lines)
+        self.assertIn('employees_http_db_queries_total{endpoint="a\\"b\\\\c",method="POST",status="400"} 0', lines)
+        self.assertEqual(
+            [line for line in lines if line.startswith("# TYPE")],
+            [
+                "# TYPE employees_http_request_duration_seconds histogram",
+                "# TYPE employees_http_db_queries_total counter",
+                "# TYPE employees_http_db_duration_seconds_total counter",
+                "# TYPE employees_http_response_bytes_total counter",
+            ],
+        )
+
+    @override_settings(EMPLOYEES_METRICS_TOKEN="scrape-token")
+    def test_endpoint(self):
+        APIClient().get("/api/v1/employees/")
+        response = APIClient().get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertIn('endpoint="api/v1/employees/",method="GET",status="200"', response.content.decode())
+
+    def test_endpoint_access(self):
+        staff = User.objects.create_user("staff", password="password", is_staff=True)
+        user = User.objects.create_user("user", password="password")
+        for token, authorization, login, status in (
+            ("", "", None, 403),
+            ("", "Bearer ", None, 403),
+            ("scrape-token", "Bearer other-token", None, 403),
+            ("scrape-token", "Token scrape-token", None, 403),
+            ("scrape-token", "", user, 403),
+            ("scrape-token", "Bearer scrape-token", None, 200),
+            ("", "", staff, 200),
+        ):
+            client = APIClient()
+            if login:
+                client.force_login(login)
+            with self.subTest(token=token, authorization=authorization, login=login), \
+                    override_settings(EMPLOYEES_METRICS_TOKEN=token):
+                self.assertEqual(client.get("/metrics", HTTP_AUTHORIZATION=authorization).status_code, status)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=5, seed=1, stdout=io.StringIO())
+        cls.user = User.objects.create_user("manager", "manager@example.com", "password")
+        cls.employee = Employee.objects.first()
+        cls.employee.user = cls.user
+        cls.employee.save()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_cache_hit_runs_no_auth_queries(self):
+        self.client.get("/api/v1/employees/cache-stats/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/v1/employees/create/", {
+                "full_name": "Петров Пётр Петрович",
+                "position": "Junior-разработчик",
+                "specialization": "Python",
+                "city": "Москва",
+                "country": "Россия",
+            }, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse([query for query in queries if "authtoken_token" in query["sql"] or "auth_user" in query["sql"]])
+        self.assertEqual(Employee.objects.get(full_name="Петров Пётр Петрович").manager_id, self.employee.pk)
+
+    def test_deleted_token_is_rejected(self):
+        self.assertEqual(self.client.get("/api/v1/employees/cache-stats/").status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get("/api/v1/employees/cache-stats/").status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get("/api/v1/employees/cache-stats/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get("/api/v1/employees/cache-stats/").status_code, 401)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def row(self, index, **fields):
+        return {
+            "full_name": f"Сидоров Сидор {index}",
+            "position": "Junior-разработчик",
+            "specialization": "Python",
+            "city": "Москва",
+            "country": "Россия",
+            "telegram_nick": f"@sidorov{index}",
+            "about": "",
+            **fields,
+        }
+
+    def test_import(self):
+        for staging in (True, False):
+            with self.subTest(staging=staging), override_settings(EMPLOYEES_IMPORT_STAGING=staging):
+                result = get_importer(batch_size=3).run([self.row(index) for index in range(7)])
+                self.assertEqual(result.errors, [])
+                self.assertEqual(result.created_count, 7)
+                self.assertEqual(
+                    list(Employee.objects.order_by("id").values_list("full_name", flat=True)),
+                    [f"Сидоров Сидор {index}" for index in range(7)],
+                )
+                Employee.objects.all().delete()
+
+    def test_error_rolls_back_everything(self):
+        # The first chunk is already written when the bad line is found
+        for field, value, reported in (("position", "Стажёр", "position"), ("city", "Париж", "location")):
+            rows = [self.row(index) for index in range(7)]
+            rows[3][field] = value
+            for staging in (True, False):
+                with self.subTest(field=field, staging=staging), override_settings(EMPLOYEES_IMPORT_STAGING=staging):
+                    result = get_importer(batch_size=3).run(rows)
+                    self.assertEqual([(error["line"], list(error["errors"])) for error in result.errors], [(5, [reported])])
+                    self.assertEqual(result.created_count, 0)
+                    self.assertFalse(Employee.objects.exists())
+
+    def test_max_errors(self):
+        rows = [self.row(index, position="Стажёр") for index in range(10)]
+        result = get_importer(batch_size=2, max_errors=3).run(rows)
+        # Checking stops at the chunk that reached the limit
+        self.assertEqual([error["line"] for error in result.errors], [2, 3, 4, 5])
+        self.assertFalse(Employee.objects.exists())
+
+
+class StagingImportTests(TestCase):
+    # EmployeeStagingImporter writes through SQL of its own; the result must be the same as EmployeeBulkImporter's
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = Employee.objects.create(
+            full_name="Иванов Иван Иванович", position="Менеджер", specialization="Python",
+            location=Location.objects.get(city="Москва"),
+        )
+
+    def setUp(self):
+        get_cache().clear()
+
+    def rows(self):
+        return [
+            {"full_name": "Сидоров Сидор Сидорович", "position": "Junior-разработчик", "specialization": "Python",
+             "city": "Москва", "country": "Россия", "telegram_nick": "@sidorov", "about": "Табы\tи\\слэши\nв тексте"},
+            {"full_name": "Петров Пётр", "position": "Senior-разработчик", "specialization": "Python",
+             "city": "Париж", "country": "Франция", "telegram_nick": "", "about": ""},
+        ]
+
+    def run_import(self, staging, rows):
+        fields = [
+            field.name for field in Employee._meta.concrete_fields if field.name not in ("id", "updated_at")
+        ]
+        with override_settings(EMPLOYEES_IMPORT_STAGING=staging):
+            result = get_importer(manager=self.manager).run(rows)
+        created = Employee.objects.exclude(pk=self.manager.pk)
+        employees = list(created.order_by("id").values_list(*fields))
+        created.delete()
+        return result, employees
+
+    def test_same_rows(self):
+        staged, staged_rows = self.run_import(True, self.rows())
+        bulk, bulk_rows = self.run_import(False, self.rows())
+        self.assertEqual((staged.errors, bulk.errors), ([], []))
+        self.assertEqual(len(staged_rows), 2)
+        self.assertEqual(staged_rows, bulk_rows)
+
+    def test_same_errors(self):
+        rows = self.rows() * 2
+        rows[1] = {**rows[1], "country": "Россия"}
+        rows[2] = {**rows[2], "position": "Стажёр"}
+        staged, _ = self.run_import(True, rows)
+        bulk, _ = self.run_import(False, rows)
+        self.assertEqual([error["line"] for error in staged.errors], [3, 4])
+        self.assertEqual(staged.errors, bulk.errors)
+        self.assertFalse(Employee.objects.exclude(pk=self.manager.pk).exists())
+
+
+class CsvUploadTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def upload(self, content):
+        file = SimpleUploadedFile("employees.csv", content, content_type="text/csv")
+        return APIClient().post("/api/v1/employees/upload/", {"file": file}, format="multipart")
+
+    def test_upload(self):
+        # Excel's BOM, CRLF line ends and a quoted field spanning two lines
+        content = (
+            "\ufefffull_name,position,specialization,city,country,telegram_nick,about\r\n"
+            "Сидоров Сидор,Junior-разработчик,Python,Москва,Россия,@sidorov,\"Первая строка\r\nвторая\"\r\n"
+            "Петров Пётр,Middle-разработчик,Python,Париж,Франция,@petrov,\r\n"
+        ).encode("utf-8")
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual((data["created_count"], data["rows_processed"]), (2, 2))
+        self.assertEqual(data["bytes_processed"], len(content))
+        self.assertEqual(Employee.objects.get(telegram_nick="@sidorov").about, "Первая строка\r\nвторая")
+
+    def test_error_report(self):
+        content = (
+            "full_name,position,specialization,city,country,telegram_nick,about\n"
+            "Сидоров Сидор,Junior-разработчик,Python,Москва,Россия,@sidorov,\n"
+            "Петров Пётр,Стажёр,Python,Москва,Россия,@petrov,\n"
+        ).encode("utf-8")
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual((data["created_count"], data["rows_processed"]), (0, 2))
+        self.assertEqual([(error["line"], list(error["errors"])) for error in data["errors"]], [(3, ["position"])])
+        self.assertFalse(Employee.objects.exists())
+
+    def test_not_utf8(self):
+        content = "full_name\nСидоров Сидор\n".encode("cp1251")
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Ошибка при чтении файла", response.json()["error"])
+        self.assertFalse(Employee.objects.exists())
+
+
+# Without workers the job is processed by an on_commit callback of the upload request
+@override_settings(EMPLOYEES_IMPORT_WORKERS=0)
+class AsyncImportTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client = APIClient()
+
+    def upload(self, lines):
+        content = "\n".join(["full_name,position,specialization,city,country,telegram_nick,about", *lines])
+        file = SimpleUploadedFile("employees.csv", content.encode("utf-8"), content_type="text/csv")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/v1/employees/upload/?async=1", {"file": file}, format="multipart")
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json()["status"], "pending")
+        return response.json()
+
+    def poll(self, job):
+        response = self.client.get(job["status_url"])
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_succeeded(self):
+        job = self.upload([
+            "Сидоров Сидор,Junior-разработчик,Python,Москва,Россия,@sidorov,",
+            "Петров Пётр,Middle-разработчик,Python,Париж,Франция,@petrov,",
+        ])
+        status = self.poll(job)
+        self.assertEqual(status["status"], "succeeded")
+        self.assertEqual((status["created_count"], status["rows_processed"], status["errors"]), (2, 2, []))
+        self.assertIsNotNone(status["finished_at"])
+        self.assertEqual(set(Employee.objects.values_list("telegram_nick", flat=True)), {"@sidorov", "@petrov"})
+        # The uploaded file is not kept after the job
+        self.assertEqual(ImportJob.objects.get(pk=job["id"]).file.name, "")
+
+    def test_failed(self):
+        job = self.upload([
+            "Сидоров Сидор,Junior-разработчик,Python,Москва,Россия,@sidorov,",
+            "Петров Пётр,Стажёр,Python,Москва,Россия,@petrov,",
+        ])
+        status = self.poll(job)
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(status["created_count"], 0)
+        self.assertEqual([(error["line"], list(error["errors"])) for error in status["errors"]], [(3, ["position"])])
+        self.assertFalse(Employee.objects.exists())
+
+    def test_claimed_once(self):
+        job = self.upload(["Сидоров Сидор,Junior-разработчик,Python,Москва,Россия,@sidorov,"])
+        finished = self.poll(job)
+        with self.assertNumQueries(1):
+            process_import_job(job["id"])
+        self.assertEqual(self.poll(job), finished)
+        self.assertEqual(Employee.objects.count(), 1)
+
+        # A job another worker is running is left alone as well
+        running = ImportJob.objects.create(file="imports/employees.csv", status="running")
+        with self.assertNumQueries(1):
+            process_import_job(running.pk)
+        running.refresh_from_db()
+        self.assertEqual((running.status, running.file.name), ("running", "imports/employees.csv"))
+
+
+class ExportTests(TestCase):
+    CSV = (
+        "full_name,position,specialization,city,country,telegram_nick,about\r\n"
+        "Иванов Иван,Middle-разработчик,Python,Париж,Франция,@ivanov,\r\n"
+        "Иванов Иван,Junior-разработчик,Python,Москва,Россия,@ivanov2,\r\n"
+        "Петров Пётр,Junior-разработчик,Python,Москва,Россия,@petrov,\"Кавычки \"\"да\"\", запятая\nи вторая строка\"\r\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        # Created out of the export order: by full_name, namesakes by id
+        rows = [
+            ("Петров Пётр", "Junior-разработчик", "Москва", "Россия", "@petrov", 'Кавычки "да", запятая\nи вторая строка'),
+            ("Иванов Иван", "Middle-разработчик", "Париж", "Франция", "@ivanov", ""),
+            ("Иванов Иван", "Junior-разработчик", "Москва", "Россия", "@ivanov2", ""),
+        ]
+        result = get_importer().run([
+            {"full_name": full_name, "position": position, "specialization": "Python", "city": city,
+             "country": country, "telegram_nick": nick, "about": about}
+            for full_name, position, city, country, nick, about in rows
+        ])
+        assert not result.errors, result.errors
+        cls.user = User.objects.create_user("user", "user@example.com", "password")
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, export_format):
+        response = self.client.get("/api/v1/employees/export/", {"format": export_format})
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_csv(self):
+        self.assertEqual(self.export("csv"), self.CSV)
+
+    def test_ndjson(self):
+        lines = self.export("ndjson").splitlines()
+        self.assertEqual(len(lines), 3)
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(list(rows[0]), ["full_name", "position", "specialization", "city", "country", "telegram_nick", "about"])
+        self.assertEqual([row["telegram_nick"] for row in rows], ["@ivanov", "@ivanov2", "@petrov"])
+        self.assertEqual(rows[2]["about"], 'Кавычки "да", запятая\nи вторая строка')
+
+    def test_accept_header(self):
+        response = self.client.get("/api/v1/employees/export/", HTTP_ACCEPT="application/x-ndjson")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="employees.ndjson"')
+
+    def test_renderer(self):
+        # Outside the view the renderers give the whole file at once
+        queryset = Employee.objects.order_by("full_name", "id")
+        self.assertEqual(CSVRenderer().render(queryset).decode("utf-8"), self.CSV)
+        self.assertEqual(NDJSONRenderer().render(queryset).decode("utf-8"), self.export("ndjson"))
+
+    def test_round_trip(self):
+        content = self.export("csv")
+        Employee.objects.all().delete()
+        file = SimpleUploadedFile("employees.csv", content.encode("utf-8"), content_type="text/csv")
+        response = self.client.post("/api/v1/employees/upload/", {"file": file}, format="multipart")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()["created_count"], 3)
+        self.assertEqual(self.export("csv"), content)
+
+
+class UpsertImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = Employee.objects.create(
+            full_name="Иванов Иван Иванович",
+            position="Менеджер",
+            specialization="Python",
+            location=Location.objects.get(city="Москва"),
+            telegram_nick="@ivanov",
+        )
+        cls.subordinate = Employee.objects.create(
+            full_name="Петров Пётр Петрович",
+            position="Junior-разработчик",
+            specialization="Python",
+            location=Location.objects.get(city="Москва"),
+            telegram_nick="@petrov",
+            about="",
+            manager=cls.manager,
+        )
+
+    def setUp(self):
+        # Locations changed by other tests are rolled back without a version bump
+        get_cache().clear()
+
+    def row(self, full_name, nick, city="Москва", country="Россия"):
+        return {
+            "full_name": full_name,
+            "position": "Junior-разработчик",
+            "specialization": "Python",
+            "city": city,
+            "country": country,
+            "telegram_nick": nick,
+            "about": "",
+        }
+
+    def check_upsert(self):
+        rows = [
+            self.row("Иванов Иван Сергеевич", "@ivanov"),
+            self.row("Петров Пётр Петрович", "@petrov"),
+            self.row("Сидоров Сидор Сидорович", "@sidorov", city="Париж", country="Франция"),
+        ]
+        result = get_importer(upsert=True).run(rows)
+        self.assertEqual(result.errors, [])
+        self.assertEqual((result.created_count, result.updated_count, result.unchanged_count), (1, 1, 1))
+
+        manager = Employee.objects.get(pk=self.manager.pk)
+        self.assertEqual((manager.full_name, manager.position), ("Иванов Иван Сергеевич", "Junior-разработчик"))
+        self.assertEqual(Employee.objects.get(pk=self.subordinate.pk).manager_short_name, "Иванов И.С.")
+        self.assertEqual(Employee.objects.get(telegram_nick="@sidorov").location_label, "Париж, Франция")
+
+        # The same file again changes nothing
+        result = get_importer(upsert=True).run(rows)
+        self.assertEqual((result.created_count, result.updated_count, result.unchanged_count), (0, 0, 3))
+
+    @override_settings(EMPLOYEES_IMPORT_STAGING=False)
+    def test_upsert_bulk(self):
+        self.check_upsert()
+
+    @override_settings(EMPLOYEES_IMPORT_STAGING=True)
+    def test_upsert_staging(self):
+        self.check_upsert()
+
+    def test_repeated_nick_is_rejected(self):
+        rows = [self.row("Сидоров Сидор", "@sidorov"), self.row("Сидоров Сидор", "@sidorov")]
+        result = get_importer(upsert=True).run(rows)
+        self.assertEqual([error["line"] for error in result.errors], [3])
+        self.assertFalse(Employee.objects.filter(telegram_nick="@sidorov").exists())
+
+    def test_repeated_nick_in_later_chunk(self):
+        # Nicks of earlier chunks are no longer in memory, they are looked up in the database
+        rows = [
+            self.row("Сидоров Сидор", "@sidorov"),
+            self.row("Иванов Иван Сергеевич", "@ivanov"),
+            self.row("Козлов Кирилл", "@kozlov"),
+            self.row("Иванов Иван Петрович", "@ivanov"),
+            self.row("Сидоров Сидор", "@sidorov"),
+        ]
+        for staging in (True, False):
+            with self.subTest(staging=staging), override_settings(EMPLOYEES_IMPORT_STAGING=staging):
+                result = get_importer(upsert=True, batch_size=2).run(rows)
+                self.assertEqual(
+                    [(error["line"], str(error["errors"]["telegram_nick"])) for error in result.errors],
+                    [(5, "Ник @ivanov уже встречался в строке 3."), (6, "Ник @sidorov уже встречался в строке 2.")],
+                )
+                self.assertFalse(Employee.objects.filter(telegram_nick__in=["@sidorov", "@kozlov"]).exists())
+                self.assertEqual(Employee.objects.get(pk=self.manager.pk).full_name, "Иванов Иван Иванович")
+
+    def test_invalid_mode(self):
+        file = SimpleUploadedFile("employees.csv", b"full_name\n", content_type="text/csv")
+        response = APIClient().post("/api/v1/employees/upload/?mode=replace", {"file": file}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        location = Location.objects.get(city="Москва")
+        cls.ids = {}
+        for full_name, about in (
+            ("Иванов Иван Иванович", ""),
+            ("Петров Пётр Петрович", "Работал с Ивановым"),
+            ("Иваненко Олег Сергеевич", "Пишет на Python"),
+            ("Сидоров Сидор Сидорович", "Python и Django"),
+        ):
+            cls.ids[full_name.split()[0]] = Employee.objects.create(
+                full_name=full_name, about=about, position="Junior-разработчик", specialization="Python",
+                location=location,
+            ).pk
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def search(self, query, **params):
+        response = self.client.get("/api/v1/employees/search/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        names = {pk: name for name, pk in self.ids.items()}
+        return [names[result["id"]] for result in response.json()["results"]]
+
+    def test_ranking(self):
+        # A name outranks "about", a whole word outranks a prefix of a longer one
+        self.assertEqual(self.search("иванов"), ["Иванов", "Петров"])
+        self.assertEqual(self.search("иван")[:2], ["Иванов", "Иваненко"])
+        self.assertEqual(self.search("python"), ["Иваненко", "Сидоров"])
+
+    def test_all_terms_match(self):
+        self.assertEqual(self.search("python django"), ["Сидоров"])
+        self.assertEqual(self.search("иван django"), [])
+        # ё and е are the same letter
+        self.assertEqual(self.search("петр"), ["Петров"])
+
+    def test_limit(self):
+        self.assertEqual(len(self.search("иван", limit=1)), 1)
+        for limit in ("0", "много"):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.client.get("/api/v1/employees/search/", {"q": "иван", "limit": limit}).status_code, 400)
+        self.assertEqual(self.client.get("/api/v1/employees/search/", {"q": " "}).status_code, 400)
+
+    def test_index_follows_changes(self):
+        self.assertEqual(self.search("кузнецов"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            employee = Employee.objects.get(pk=self.ids["Сидоров"])
+            employee.full_name = "Кузнецов Сидор Сидорович"
+            employee.save()
+        self.assertEqual(self.search("кузнецов"), ["Сидоров"])
+
+    def test_inverted_index(self):
+        index = InvertedIndex([(1, "Иванов Иван", None), (2, "Петров Пётр", "иванов"), (3, "Иваненко Олег", "")])
+        self.assertEqual(index.search(["иванов"]), [(1, 2.5), (2, 1.5)])
+        self.assertEqual([pk for pk, _ in index.search(["ива"])], [1, 3, 2])
+        self.assertEqual(index.search(["иванов", "петр"]), [(2, 4.0)])
+        self.assertEqual(index.search(["нет"]), [])
+
+
+class ListCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=10, seed=1, stdout=io.StringIO())
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def get_list(self):
+        response = self.client.get("/api/v1/employees/", {"page_size": 100})
+        return response["X-Cache"], {employee["id"]: employee for employee in response.json()["results"]}
+
+    def assertInvalidated(self, change):
+        self.get_list()
+        self.assertEqual(self.get_list()[0], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        status, employees = self.get_list()
+        self.assertEqual(status, "MISS")
+        return employees
+
+    def test_employee_save(self):
+        employee = Employee.objects.first()
+
+        def rename():
+            employee.full_name = "Иванов Иван Иванович"
+            employee.save()
+
+        self.assertEqual(self.assertInvalidated(rename)[employee.pk]["full_name"], "Иванов Иван Иванович")
+
+    def test_employee_delete(self):
+        employee = Employee.objects.first()
+        self.assertNotIn(employee.pk, self.assertInvalidated(employee.delete))
+
+    def test_location_save(self):
+        employee = Employee.objects.first()
+        location = employee.location
+
+        def rename():
+            location.city = "Ленинград"
+            location.save()
+
+        self.assertEqual(self.assertInvalidated(rename)[employee.pk]["city"], "Ленинград")
+
+    def test_location_delete(self):
+        location = Location.objects.create(city="Лион", country="Франция")
+        self.assertInvalidated(location.delete)
+
+    def test_not_committed(self):
+        # Until the transaction commits, the cached pages stay: other requests still see the old rows
+        self.get_list()
+        employee = Employee.objects.first()
+        employee.about = "Изменено"
+        employee.save()
+        self.assertEqual(self.get_list()[0], "HIT")
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=30, seed=1, stdout=io.StringIO())
+        # Namesakes, so pages have to be cut inside a run of equal full_name
+        for employee in Employee.objects.order_by("id")[:12]:
+            employee.full_name = "Иванов Иван Иванович"
+            employee.save()
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def test_pages(self):
+        expected = list(Employee.objects.order_by("full_name", "id").values_list("id", flat=True))
+        seen = []
+        url, params = "/api/v1/employees/", {"page_size": 7, "cursor": ""}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(data["count"], len(expected))
+            seen += [employee["id"] for employee in data["results"]]
+            url, params = data["next"], None
+        self.assertEqual(seen, expected)
+
+    def test_page_after_deleted_row(self):
+        # The cursor holds a position, not an offset: rows deleted before it do not shift the next page
+        first = self.client.get("/api/v1/employees/", {"page_size": 5, "cursor": ""}).json()
+        expected = list(Employee.objects.order_by("full_name", "id").values_list("id", flat=True))[5:10]
+        Employee.objects.filter(pk=first["results"][0]["id"]).delete()
+        data = self.client.get(first["next"]).json()
+        self.assertEqual([employee["id"] for employee in data["results"]], expected)
+
+    def test_without_count(self):
+        data = self.client.get("/api/v1/employees/", {"cursor": "", "count": "false"}).json()
+        self.assertNotIn("count", data)
+        self.assertEqual(len(data["results"]), 5)
+
+    def test_bad_cursor(self):
+        for cursor in ("не-курсор", "%%%", self.cursor({"a": 1}), self.cursor(["x", "y"]), self.cursor(None),
+                       self.cursor(["x", [1]]), self.cursor(["x", 10 ** 20]), self.cursor(["x", 1.5]),
+                       self.cursor(["x", 0])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/v1/employees/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()["detail"], "Неверный курсор.")
+
+
+class FastSerializersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=30, seed=1, stdout=io.StringIO())
+        cls.employee = Employee.objects.filter(manager__isnull=False).first()
+        cls.manager = Employee.objects.filter(manager__isnull=True).first()
+        Employee.objects.filter(pk=cls.employee.pk).update(about='Кавычки " и \\ в тексте')
+
+    def get_both(self, url, params=None):
+        contents = []
+        for fast in (False, True):
+            # The list pages are cached under the same key with either serializer
+            get_cache().clear()
+            with override_settings(EMPLOYEES_FAST_SERIALIZERS=fast):
+                response = APIClient().get(url, params)
+            self.assertEqual(response.status_code, 200, response.content)
+            contents.append(response.content)
+        return contents
+
+    def test_same_json(self):
+        ids = ",".join(str(pk) for pk in [self.employee.pk, self.manager.pk, 10 ** 6])
+        for url, params in (
+            ("/api/v1/employees/", {"page_size": 10, "page": 2}),
+            ("/api/v1/employees/", {"page_size": 10, "cursor": ""}),
+            (f"/api/v1/employees/{self.employee.pk}/", None),
+            (f"/api/v1/employees/{self.manager.pk}/", None),
+            ("/api/v1/employees/batch/", {"ids": ids}),
+        ):
+            with self.subTest(url=url, params=params):
+                slow, fast = self.get_both(url, params)
+                # Bytes, so the key order has to match as well
+                self.assertEqual(fast, slow)
+                self.assertTrue(json.loads(fast))
+
+    def test_detail_without_manager(self):
+        slow, fast = self.get_both(f"/api/v1/employees/{self.manager.pk}/")
+        self.assertNotIn("manager_id", json.loads(fast))
+        self.assertEqual(fast, slow)
+
+
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=30, seed=1, stdout=io.StringIO())
+        cls.employee = Employee.objects.filter(manager__isnull=False).first()
+        cls.manager = Employee.objects.filter(manager__isnull=True).first()
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def get_both(self, path, params=None):
+        # The same request to the sync view and to its async twin; the links are compared by the sync path
+        sync = self.client.get(f"/api/v1/employees/{path}", params)
+        get_cache().clear()
+        response = self.client.get(f"/api/v1/employees/async/{path}", params)
+        self.assertEqual(response.status_code, sync.status_code, response.content)
+        content = response.content.replace(b"/api/v1/employees/async/", b"/api/v1/employees/")
+        return sync.json(), json.loads(content)
+
+    def test_list(self):
+        last = self.client.get("/api/v1/employees/", {"page_size": 7}).json()["count"] // 7 + 1
+        for params in (
+            {"page_size": 7},
+            {"page_size": 7, "page": 2},
+            {"page_size": 7, "page": last},
+            {"page_size": 7, "page": "last"},
+            {"page_size": 100},
+            {"position": self.employee.position},
+            {"location__city": self.employee.location_city, "specialization": self.employee.specialization},
+            {"manager": self.manager.pk},
+            {"page": 100},
+            {"page": "x"},
+            {"position": "Стажёр"},
+            {"manager": 10 ** 6},
+            {"manager": "x"},
+        ):
+            with self.subTest(params=params):
+                sync, data = self.get_both("", params)
+                self.assertEqual(data, sync)
+
+    def test_keyset(self):
+        params = {"page_size": 7, "cursor": ""}
+        while params:
+            with self.subTest(params=params):
+                sync, data = self.get_both("", params)
+                self.assertEqual(data, sync)
+            params = dict(parse_qsl(urlsplit(sync["next"]).query)) if sync["next"] else None
+
+        for params in ({"cursor": "", "count": "false"}, {"cursor": "не-курсор"}):
+            with self.subTest(params=params):
+                sync, data = self.get_both("", params)
+                self.assertEqual(data, sync)
+
+    def test_detail(self):
+        for pk in (self.employee.pk, self.manager.pk, 10 ** 6):
+            with self.subTest(pk=pk):
+                sync, data = self.get_both(f"{pk}/")
+                self.assertEqual(data, sync)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=20, seed=1, stdout=io.StringIO())
+        cls.employee = Employee.objects.filter(manager__isnull=False).first()
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_detail(self):
+        url = f"/api/v1/employees/{self.employee.pk}/"
+        response = self.client.get(url)
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        # A renamed manager is shown in the card, so the subordinate's tag changes too
+        with self.captureOnCommitCallbacks(execute=True):
+            manager = self.employee.manager
+            manager.full_name = "Иванов Иван Иванович"
+            manager.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_list(self):
+        params = {"position": self.employee.position}
+        etag = self.client.get("/api/v1/employees/", params)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/v1/employees/", params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A change outside the filter set drops the cached pages, but not the set's version
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Employee.objects.exclude(position=self.employee.position).first()
+            other.about = "Изменено"
+            other.save()
+        self.assertEqual(self.client.get("/api/v1/employees/", params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.employee.delete()
+        self.assertEqual(self.client.get("/api/v1/employees/", params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class HeadcountCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=30, seed=1, stdout=io.StringIO())
+
+    def setUp(self):
+        get_cache().clear()
+
+    def assertNoDrift(self):
+        self.assertEqual(reconcile(fix=False), [])
+
+    def test_single_writes(self):
+        self.assertNoDrift()
+        employee = Employee.objects.create(
+            full_name="Петров Пётр Петрович",
+            position="Junior-разработчик",
+            specialization="Python",
+            location=Location.objects.get(city="Москва"),
+            manager=Employee.objects.filter(manager__isnull=True).first(),
+        )
+        self.assertNoDrift()
+
+        employee = Employee.objects.only("id", "full_name").get(pk=employee.pk)
+        employee.position = "Middle-разработчик"
+        employee.location = Location.objects.get(city="Париж")
+        employee.manager = None
+        employee.save()
+        self.assertNoDrift()
+
+        Employee.objects.filter(subordinates__isnull=False).first().delete()
+        self.assertNoDrift()
+
+        location = Location.objects.get(city="Париж")
+        location.city = "Лион"
+        location.save()
+        self.assertNoDrift()
+
+    def test_delete_manager_with_subordinates(self):
+        # The manager and one of their subordinates in one collection: the subordinate must not
+        # be moved to "no manager" on top of being subtracted
+        manager = Employee.objects.filter(subordinates__isnull=False).first()
+        subordinate = manager.subordinates.first()
+        Employee.objects.filter(pk__in=[manager.pk, subordinate.pk]).delete()
+        self.assertNoDrift()
+
+        # Subordinates first, then the manager, from instances loaded before either delete
+        manager = Employee.objects.filter(subordinates__isnull=False).first()
+        subordinates = list(manager.subordinates.all())
+        for employee in subordinates:
+            employee.delete()
+        manager.delete()
+        self.assertNoDrift()
+
+    def test_uploads(self):
+        manager = Employee.objects.first()
+        for staging in (True, False):
+            rows = [
+                {"full_name": f"Сидоров Сидор {index}", "position": "Junior-разработчик", "specialization": "Python",
+                 "city": "Москва", "country": "Россия", "telegram_nick": f"@sidorov{index}", "about": ""}
+                for index in range(10)
+            ]
+            with self.subTest(staging=staging), override_settings(EMPLOYEES_IMPORT_STAGING=staging):
+                self.assertEqual(get_importer(manager=manager).run(rows).errors, [])
+                self.assertNoDrift()
+                for row in rows[:5]:
+                    row.update(position="Senior-разработчик", city="Париж", country="Франция")
+                result = get_importer(manager=manager, upsert=True).run(rows)
+                self.assertEqual((result.updated_count, result.errors), (5, []))
+                self.assertNoDrift()
+                Employee.objects.filter(telegram_nick__startswith="@sidorov").delete()
+
+    def test_reconcile_command(self):
+        HeadcountCounter.objects.filter(dimension="position").update(count=0)
+        HeadcountCounter.objects.create(dimension="manager", value="999999", count=3)
+        with self.assertRaises(CommandError):
+            call_command("reconcile_headcount_stats", "--dry-run", stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command("reconcile_headcount_stats", stdout=out)
+        self.assertIn("manager=999999: в счётчике 3, на самом деле 0", out.getvalue())
+        self.assertNoDrift()
+        self.assertFalse(HeadcountCounter.objects.filter(value="999999").exists())
+
+
+class DenormalizedFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moscow = Location.objects.get(city="Москва")
+        cls.manager = cls.create("Иванов Иван Иванович")
+        cls.other_manager = cls.create("Смирнов Олег Петрович")
+        cls.employee = cls.create("Петров Пётр Петрович", manager=cls.manager)
+
+    @classmethod
+    def create(cls, full_name, **fields):
+        return Employee.objects.create(
+            full_name=full_name, position="Junior-разработчик", specialization="Python", location=cls.moscow, **fields
+        )
+
+    def setUp(self):
+        get_cache().clear()
+
+    def assertCopies(self, manager_short_name, location_label):
+        self.assertEqual(
+            Employee.objects.filter(pk=self.employee.pk).values_list(*DENORMALIZED_FIELDS).get(),
+            (manager_short_name, location_label.split(",")[0], location_label),
+        )
+
+    def test_create(self):
+        self.assertCopies("Иванов И.И.", "Москва, Россия")
+
+    def test_manager_rename(self):
+        # A subordinate loaded before the rename and saved afterwards keeps the new name
+        stale = Employee.objects.get(pk=self.employee.pk)
+        manager = Employee.objects.get(pk=self.manager.pk)
+        manager.full_name = "Кузнецов Андрей Львович"
+        manager.save()
+        self.assertCopies("Кузнецов А.Л.", "Москва, Россия")
+        stale.about = "Изменено"
+        stale.save()
+        self.assertCopies("Кузнецов А.Л.", "Москва, Россия")
+
+    def test_reassignment(self):
+        employee = Employee.objects.get(pk=self.employee.pk)
+        employee.manager = self.other_manager
+        employee.location = Location.objects.get(city="Париж")
+        employee.save()
+        self.assertCopies("Смирнов О.П.", "Париж, Франция")
+
+        employee.manager = None
+        employee.save(update_fields=["manager"])
+        self.assertCopies(None, "Париж, Франция")
+
+    def test_manager_delete(self):
+        Employee.objects.get(pk=self.manager.pk).delete()
+        self.assertCopies(None, "Москва, Россия")
+
+    def test_location_rename(self):
+        location = Location.objects.get(pk=self.moscow.pk)
+        location.city = "Ленинград"
+        location.save()
+        self.assertCopies("Иванов И.И.", "Ленинград, Россия")
+
+
+class TreePathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # a -> b -> c -> d, and e on its own
+        location = Location.objects.get(city="Москва")
+        cls.ids = {}
+        for name, manager in (("a", None), ("b", "a"), ("c", "b"), ("d", "c"), ("e", None)):
+            cls.ids[name] = Employee.objects.create(
+                full_name=f"Сотрудник {name}", position="Junior-разработчик", specialization="Python",
+                location=location, manager_id=cls.ids.get(manager),
+            ).pk
+
+    def setUp(self):
+        get_cache().clear()
+
+    def get(self, name):
+        return Employee.objects.get(pk=self.ids[name])
+
+    def assertPaths(self, expected):
+        # {name: chain of manager names}
+        paths = dict(Employee.objects.values_list("id", "tree_path"))
+        names = {pk: name for name, pk in self.ids.items()}
+        self.assertEqual(
+            {names[pk]: "/".join(names[int(part)] for part in path.strip("/").split("/") if part)
+             for pk, path in paths.items() if pk in names},
+            expected,
+        )
+        self.assertEqual(list(find_broken_nodes()), [])
+
+    def test_create(self):
+        self.assertPaths({"a": "", "b": "a", "c": "a/b", "d": "a/b/c", "e": ""})
+        self.assertEqual(self.get("d").tree_depth, 3)
+
+    def test_reassign(self):
+        # The whole subtree moves with the employee
+        b = self.get("b")
+        b.manager_id = self.ids["e"]
+        b.save()
+        self.assertPaths({"a": "", "b": "e", "c": "e/b", "d": "e/b/c", "e": ""})
+
+        c = self.get("c")
+        c.manager = None
+        c.save()
+        self.assertPaths({"a": "", "b": "e", "c": "", "d": "c", "e": ""})
+        self.assertEqual(self.get("d").tree_depth, 1)
+
+    def test_delete(self):
+        self.get("b").delete()
+        self.assertPaths({"a": "", "c": "", "d": "c", "e": ""})
+        self.assertEqual(self.get("d").tree_depth, 1)
+
+    def test_cycle(self):
+        a = self.get("a")
+        a.manager_id = self.ids["d"]
+        with self.assertRaises(ValueError):
+            a.save()
+        self.assertPaths({"a": "", "b": "a", "c": "a/b", "d": "a/b/c", "e": ""})
+        self.assertIsNone(self.get("a").manager_id)
+
+    @override_settings(EMPLOYEES_TREE_INDEX=False)
+    def test_cycle_without_tree_index(self):
+        for name, manager in (("a", "d"), ("b", "b")):
+            employee = self.get(name)
+            employee.manager_id = self.ids[manager]
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                employee.save()
+        self.assertEqual(Employee.objects.get(pk=self.ids["b"]).manager_id, self.ids["a"])
+
+    def test_deep_chain(self):
+        # Deeper than EMPLOYEES_HIERARCHY_MAX_DEPTH, with a path longer than any varchar limit would allow
+        employee = self.get("d")
+        for index in range(150):
+            employee = Employee.objects.create(
+                full_name=f"Сотрудник {index}", position="Junior-разработчик", specialization="Python",
+                location=employee.location, manager=employee,
+            )
+        self.assertEqual(employee.tree_depth, 153)
+        self.assertEqual(Employee.objects.get(pk=employee.pk).tree_path, employee.tree_path)
+        self.assertGreater(len(employee.tree_path), 500)
+
+        top = self.get("a")
+        top.manager = employee
+        for tree_index in (True, False):
+            with self.subTest(tree_index=tree_index), override_settings(EMPLOYEES_TREE_INDEX=tree_index):
+                with self.assertRaises(ValueError):
+                    top.save()
+
+    def test_subtree_and_ancestors(self):
+        # A second report of "a" named to sort before "b": levels come in full_name order
+        Employee.objects.create(
+            full_name="Сотрудник a2", position="Junior-разработчик", specialization="Python",
+            location=self.get("a").location, manager_id=self.ids["a"],
+        )
+        for tree_index in (True, False):
+            with self.subTest(tree_index=tree_index), override_settings(EMPLOYEES_TREE_INDEX=tree_index):
+                for depth, expected in (
+                    (0, [("a", 0)]),
+                    (1, [("a", 0), ("a2", 1), ("b", 1)]),
+                    (10, [("a", 0), ("a2", 1), ("b", 1), ("c", 2), ("d", 3)]),
+                ):
+                    rows = get_subtree(self.ids["a"], depth)
+                    self.assertEqual([(row["full_name"].split()[-1], row["depth"]) for row in rows], expected)
+                self.assertEqual(rows[-1]["manager_id"], self.ids["c"])
+                self.assertEqual(rows[-1]["manager_name"], short_name("Сотрудник c"))
+
+                for depth, expected in ((0, ["d"]), (2, ["d", "c", "b"]), (10, ["d", "c", "b", "a"])):
+                    rows = get_ancestors(self.ids["d"], depth)
+                    self.assertEqual([row["full_name"].split()[-1] for row in rows], expected)
+                    self.assertEqual([row["depth"] for row in rows], list(range(len(expected))))
+
+                self.assertEqual(get_subtree(10 ** 6, 10), [])
+                self.assertEqual(get_ancestors(10 ** 6, 10), [])
+
+    @override_settings(EMPLOYEES_TREE_INDEX=False, EMPLOYEES_HIERARCHY_MAX_DEPTH=2)
+    def test_depth_limit_without_tree_index(self):
+        # A deeper ?depth= is cut to EMPLOYEES_HIERARCHY_MAX_DEPTH, and the CTE stops there
+        client = APIClient()
+        data = client.get(f"/api/v1/employees/{self.ids['a']}/subtree/", {"depth": 10}).json()
+        self.assertEqual(data["depth"], 2)
+        self.assertEqual([row["full_name"] for row in data["results"]], ["Сотрудник a", "Сотрудник b", "Сотрудник c"])
+
+        data = client.get(f"/api/v1/employees/{self.ids['d']}/ancestors/").json()
+        self.assertEqual([row["full_name"] for row in data["results"]], ["Сотрудник c", "Сотрудник b"])
+
+        response = client.get(f"/api/v1/employees/{self.ids['a']}/subtree/", {"depth": -1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_headcount_with_and_without_tree_index(self):
+        for depth, expected in ((0, []), (1, [1]), (2, [2]), (10, [3])):
+            results = []
+            for tree_index in (True, False):
+                with override_settings(EMPLOYEES_TREE_INDEX=tree_index):
+                    results.append([branch["headcount"] for branch in get_headcount(self.ids["a"], depth)])
+            with self.subTest(depth=depth):
+                self.assertEqual(results, [expected, expected])
+
+        response = APIClient().get(f"/api/v1/employees/{self.ids['a']}/headcount/", {"depth": 0})
+        self.assertEqual(response.status_code, 400)
+        response = APIClient().get(f"/api/v1/employees/{self.ids['a']}/headcount/", {"depth": 1})
+        self.assertEqual(response.json()["headcount"], 1)
+
+    def test_rebuild(self):
+        Employee.objects.update(tree_path="/", tree_depth=0)
+        self.assertEqual(rebuild_tree(), 3)
+        self.assertPaths({"a": "", "b": "a", "c": "a/b", "d": "a/b/c", "e": ""})
+
+
+class PopulateEmployeesTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def populate(self, **options):
+        call_command("populate_employees", stdout=io.StringIO(), **options)
+        return list(Employee.objects.order_by("id").values_list(*COLUMNS))
+
+    def test_same_seed_same_data(self):
+        first = self.populate(count=40, seed=3)
+        Employee.objects.all().delete()
+        # Chunking does not change what is drawn
+        self.assertEqual(self.populate(count=40, seed=3, batch_size=7), first)
+        Employee.objects.all().delete()
+        self.assertNotEqual(self.populate(count=40, seed=4), first)
+
+    def test_tree_shape(self):
+        self.populate(count=20, seed=1, roots=2, fanout=3, batch_size=4)
+        employees = list(Employee.objects.order_by("id").select_related("manager"))
+        self.assertEqual(len(employees), 20)
+        # Two roots, then three reports for every employee in id order: 2 + 6 + 12 (cut at 20)
+        self.assertEqual([employee.manager_id for employee in employees[:2]], [None, None])
+        for index, employee in enumerate(employees[2:], start=2):
+            self.assertEqual(employee.manager_id, employees[(index - 2) // 3].pk)
+            self.assertEqual(employee.manager_short_name, short_name(employee.manager.full_name))
+        self.assertEqual(Counter(employee.tree_depth for employee in employees), {0: 2, 1: 6, 2: 12})
+        self.assertEqual(list(find_broken_nodes()), [])
+        self.assertEqual(reconcile(fix=False), [])
+
+    def test_bad_options(self):
+        with self.assertRaises(CommandError):
+            call_command("populate_employees", count=5, fanout=1, stdout=io.StringIO())
+
+
+class BackfillDenormalizedFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command("populate_employees", count=20, seed=1, stdout=io.StringIO())
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_backfill(self):
+        employee = Employee.objects.filter(manager__isnull=False).first()
+        stale = Employee.objects.filter(pk=employee.pk)
+        stale.update(manager_short_name=None, location_city="", location_label="")
+        updated_at = stale.values_list("updated_at", flat=True).get()
+        untouched = Employee.objects.exclude(pk=employee.pk).values_list("id", "updated_at")
+        before = dict(untouched)
+        generation = get_generation()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("backfill_denormalized_fields", batch_size=7, stdout=io.StringIO())
+
+        self.assertEqual(
+            stale.values_list("manager_short_name", "location_city", "location_label").get(),
+            (short_name(employee.manager.full_name), employee.location.city, str(employee.location)),
+        )
+        self.assertGreater(stale.values_list("updated_at", flat=True).get(), updated_at)
+        self.assertEqual(dict(untouched), before)
+        self.assertNotEqual(get_generation(), generation)
+        self.assertEqual(reconcile(fix=False), [])
+
+
+class DenormalizedFieldsMigrationTests(TransactionTestCase):
+    # Rows written before migration 0006 get their denormalized copies filled in by it
+    serialized_rollback = True
+    migrate_from = [("employees", "0005_employee_list_indexes")]
+    migrate_to = [("employees", "0006_employee_denormalized_fields")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_existing_rows_are_filled(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        OldEmployee = apps.get_model("employees", "Employee")
+        location = apps.get_model("employees", "Location").objects.get(city="Париж")
+        manager = OldEmployee.objects.create(
+            full_name="Иванов Иван Иванович", position="Менеджер", specialization="Python", location=location
+        )
+        OldEmployee.objects.create(
+            full_name="Петров Пётр Петрович", position="Junior-разработчик", specialization="Python",
+            location=location, manager=manager,
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        rows = apps.get_model("employees", "Employee").objects.order_by("id").values_list(
+            "location_city", "location_label", "manager_short_name"
+        )
+        self.assertEqual(list(rows), [
+            ("Париж", "Париж, Франция", None),
+            ("Париж", "Париж, Франция", "Иванов И.И."),
+        ])
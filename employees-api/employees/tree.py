@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import CharField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, Substr
+
+from employees.models import Employee
+
+# Maintenance of the materialized Employee.tree_path. Everyday changes are kept in sync
+# by Employee.save() and the pre_delete signal; these functions rebuild and check the whole tree.
+
+
+def expected_tree_path():
+    return Concat(F("manager__tree_path"), Cast("manager_id", CharField()), Value("/"))
+
+
+def rebuild_tree(model=Employee):
+    # Level by level from the roots: one UPDATE per level of the org chart.
+    # Employees stuck in a manager cycle are left with an empty path and show up in find_broken_nodes().
+    with transaction.atomic():
+        model.objects.filter(manager__isnull=True).update(tree_path="/", tree_depth=0)
+        model.objects.filter(manager__isnull=False).update(tree_path="", tree_depth=0)
+
+        managers = model.objects.filter(pk=OuterRef("manager_id"))
+        depth = 0
+        while model.objects.filter(tree_path="", manager__tree_path__startswith="/").update(
+            tree_path=Concat(
+                Subquery(managers.values("tree_path")[:1]),
+                Cast("manager_id", CharField()),
+                Value("/"),
+            ),
+            tree_depth=depth + 1,
+        ):
+            depth += 1
+        return depth
+
+
+def detach_subtree(employee):
+    # The employee is about to be deleted: their reports become roots (on_delete=SET_NULL)
+    # and everyone below moves up together with them
+    position = Employee.objects.filter(pk=employee.pk).values_list("tree_path", "tree_depth").first()
+    if position is None:
+        return
+    path, depth = position
+    prefix = f"{path}{employee.pk}/"
+    Employee.objects.filter(tree_path__startswith=prefix).update(
+        tree_path=Concat(Value("/"), Substr("tree_path", len(prefix) + 1)),
+        tree_depth=F("tree_depth") - (depth + 1),
+    )
+
+
+def find_broken_nodes():
+    # Checking every employee against their manager is enough: if each link is right,
+    # the paths are right all the way down from the roots
+    roots = Employee.objects.filter(manager__isnull=True).exclude(tree_path="/", tree_depth=0)
+    subordinates = (
+        Employee.objects.filter(manager__isnull=False)
+        .annotate(expected_path=expected_tree_path(), expected_depth=F("manager__tree_depth") + 1)
+        .exclude(tree_path=F("expected_path"), tree_depth=F("expected_depth"))
+    )
+    return roots.values_list("id", flat=True).union(subordinates.values_list("id", flat=True))
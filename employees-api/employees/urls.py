@@ -1,15 +1,38 @@
 from django.urls import path
 
+from employees import async_views
 from employees.views import (
     EmployeeListView,
+    EmployeeListCacheStatsView,
+    EmployeeExportView,
+    EmployeeSearchView,
+    EmployeeStatsView,
     EmployeeDetailView,
+    EmployeeBatchView,
+    EmployeeSubtreeView,
+    EmployeeAncestorsView,
+    EmployeeHeadcountView,
+    EmployeeReportsToView,
     EmployeeCreateView,
     BulkEmployeeUploadView,
+    ImportJobDetailView,
 )
 
 urlpatterns = [
     path("", EmployeeListView.as_view(), name="employee-list"),
+    path("cache-stats/", EmployeeListCacheStatsView.as_view(), name="employee-list-cache-stats"),
+    path("async/", async_views.employee_list, name="employee-list-async"),
+    path("async/<int:pk>/", async_views.employee_detail, name="employee-detail-async"),
+    path("export/", EmployeeExportView.as_view(), name="employee-export"),
+    path("search/", EmployeeSearchView.as_view(), name="employee-search"),
+    path("stats/", EmployeeStatsView.as_view(), name="employee-stats"),
     path("<int:pk>/", EmployeeDetailView.as_view(), name="employee-detail"),
+    path("batch/", EmployeeBatchView.as_view(), name="employee-batch"),
+    path("<int:pk>/subtree/", EmployeeSubtreeView.as_view(), name="employee-subtree"),
+    path("<int:pk>/ancestors/", EmployeeAncestorsView.as_view(), name="employee-ancestors"),
+    path("<int:pk>/headcount/", EmployeeHeadcountView.as_view(), name="employee-headcount"),
+    path("<int:pk>/reports-to/<int:manager_pk>/", EmployeeReportsToView.as_view(), name="employee-reports-to"),
     path("create/", EmployeeCreateView.as_view()),
     path("upload/", BulkEmployeeUploadView.as_view(), name="employee-bulk-upload"),
+    path("upload/<uuid:pk>/", ImportJobDetailView.as_view(), name="employee-upload-job"),
 ]
@@ -1,51 +1,325 @@
-import csv
-import io
 import logging
 
-from django.db import transaction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.generics import ListAPIView, RetrieveAPIView, CreateAPIView
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import GenericAPIView, ListAPIView, RetrieveAPIView, CreateAPIView, get_object_or_404
 from rest_framework.parsers import MultiPartParser
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from employees.models import Employee
-from employees.serializers import EmployeeListSerializer, EmployeeDetailSerializer, EmployeeCreateSerializer
+from employees.cache import get_list_page, get_stats, list_cache_key, record_lookup, set_list_page
+from employees.conditional import detail_etag, list_etag, not_modified, set_validators
+from employees.fast_serializers import DETAIL_FIELDS, LIST_FIELDS, serialize_detail_row, serialize_list_rows
+from employees.filters import EmployeeFilter
+from employees.headcount import get_headcount_stats
+from employees.hierarchy import get_ancestors, get_headcount, get_subtree, is_subordinate
+from employees.importers import EmployeeImportProgress, get_importer, read_csv_rows
+from employees.jobs import enqueue_import_job
+from employees.metrics import request_metrics
+from employees.models import Employee, ImportJob, ImportMode, parse_id
+from employees.pagination import EmployeePagination, EmployeeKeysetPagination
+from employees.query_guard import query_budget
+from employees.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+from employees.search import search_employees
+from employees.serializers import (
+    EmployeeListSerializer,
+    EmployeeDetailSerializer,
+    EmployeeCreateSerializer,
+    ImportJobSerializer,
+)
 
 logger = logging.getLogger("employees")
 
 
-class EmployeePagination(PageNumberPagination):
-    page_size = 5
-
-
 class EmployeeListView(ListAPIView):
     permission_classes = [AllowAny]
+    # Token lookup, filter set version, count, page and the manager filter check
+    query_budget = 5
 
-    queryset = Employee.objects.select_related("manager", "location").order_by("full_name")
+    queryset = Employee.objects.order_by("full_name", "id")
     serializer_class = EmployeeListSerializer
     pagination_class = EmployeePagination
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = {
-        "position": ["exact"],
-        "specialization": ["exact"],
-        "location__city": ["exact"],
-        "manager": ["exact"],
-    }
+    filterset_class = EmployeeFilter
+
+    def list(self, request, *args, **kwargs):
+        # Only JSON is cached: the browsable API renders a different page for the same data
+        if request.accepted_renderer.format != "json":
+            return self.build_page(self.filter_queryset(self.get_queryset()))
+
+        key = list_cache_key(request)
+        cached = get_list_page(key)
+        record_lookup(hit=cached is not None)
+        if cached is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            # The version is read before the page, so the tag is never newer than the content
+            etag = list_etag(request, queryset)
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            content = FastJSONRenderer().render(self.build_page(queryset).data)
+            set_list_page(key, (etag, content))
+            cache_status = "MISS"
+        else:
+            etag, content = cached
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            cache_status = "HIT"
+
+        response = HttpResponse(content, content_type="application/json")
+        response["X-Cache"] = cache_status
+        # No Last-Modified: a deleted row would not move it
+        return set_validators(response, etag)
+
+    def build_page(self, queryset):
+        if settings.EMPLOYEES_FAST_SERIALIZERS:
+            queryset = queryset.values(*LIST_FIELDS)
+            serialize = serialize_list_rows
+        else:
+            def serialize(rows):
+                return self.get_serializer(rows, many=True).data
+
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serialize(queryset))
+        return self.get_paginated_response(serialize(page))
+
+    @property
+    def paginator(self):
+        # ?cursor= (empty for the first page) switches the list to keyset pagination
+        if not hasattr(self, "_paginator"):
+            if EmployeeKeysetPagination.cursor_query_param in self.request.query_params:
+                self._paginator = EmployeeKeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class EmployeeListCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    query_budget = 1
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_stats())
+
+
+class EmployeeExportView(GenericAPIView):
+    # Token lookup and the export query (the rows are streamed after the middleware is done)
+    query_budget = 2
+
+    queryset = Employee.objects.order_by("full_name", "id")
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = EmployeeFilter
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            renderer.stream(queryset),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = f'attachment; filename="employees.{renderer.format}"'
+        return response
+
+    def handle_exception(self, exc):
+        # Errors (bad filters, no token) are reported as JSON whatever format was asked for
+        response = super().handle_exception(exc)
+        self.request.accepted_renderer = FastJSONRenderer()
+        self.request.accepted_media_type = FastJSONRenderer.media_type
+        return response
+
+
+class EmployeeSearchView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 3
+
+    def get_limit(self, request):
+        limit = settings.EMPLOYEES_SEARCH_MAX_LIMIT
+        try:
+            value = int(request.query_params.get("limit", settings.EMPLOYEES_SEARCH_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": "Лимит должен быть целым числом."})
+        if value < 1:
+            raise ValidationError({"limit": "Лимит должен быть положительным."})
+        return min(value, limit)
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "Укажите строку поиска."})
+        results = search_employees(query, self.get_limit(request))
+        return Response({"query": query, "count": len(results), "results": results})
+
+
+class EmployeeStatsView(APIView):
+    permission_classes = [AllowAny]
+    # Token lookup, the small dimensions, the biggest manager groups and their names
+    query_budget = 4
+
+    def get_limit(self, request):
+        limit = settings.EMPLOYEES_STATS_MANAGER_MAX_LIMIT
+        try:
+            value = int(request.query_params.get("limit", settings.EMPLOYEES_STATS_MANAGER_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": "Лимит должен быть целым числом."})
+        if value < 0:
+            raise ValidationError({"limit": "Лимит не может быть отрицательным."})
+        return min(value, limit)
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_headcount_stats(self.get_limit(request)))
 
 
 class EmployeeDetailView(RetrieveAPIView):
     permission_classes = [AllowAny]
+    query_budget = 2
 
-    queryset = Employee.objects.select_related("manager", "location")
+    queryset = Employee.objects.select_related("manager")
     serializer_class = EmployeeDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        if settings.EMPLOYEES_FAST_SERIALIZERS:
+            row = get_object_or_404(self.get_queryset().values(*DETAIL_FIELDS, "updated_at"), pk=kwargs["pk"])
+            updated_at = row.pop("updated_at")
+        else:
+            instance = self.get_object()
+            updated_at = instance.updated_at
+
+        etag = detail_etag(request, kwargs["pk"], updated_at)
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
+
+        if settings.EMPLOYEES_FAST_SERIALIZERS:
+            data = serialize_detail_row(row)
+        else:
+            data = self.get_serializer(instance).data
+        return set_validators(Response(data), etag, updated_at)
+
+
+class EmployeeBatchView(APIView):
+    # Many employee cards in one request: GET ?ids=1,2,3 or POST {"ids": [1, 2, 3]}.
+    # The cards come in the order of the ids, unknown ids are listed in "missing".
+    permission_classes = [AllowAny]
+    # Token lookup and one query for all the ids
+    query_budget = 2
+
+    def get_ids(self, request):
+        if request.method == "POST":
+            values = request.data.get("ids") if isinstance(request.data, dict) else None
+            if not isinstance(values, list):
+                raise ValidationError({"ids": 'Передайте список id: {"ids": [1, 2, 3]}.'})
+        else:
+            values = [value for param in request.query_params.getlist("ids") for value in param.split(",") if value.strip()]
+
+        ids = []
+        for value in values:
+            pk = parse_id(value)
+            if pk is None:
+                raise ValidationError({"ids": f"Неверный id: {value}."})
+            ids.append(pk)
+        ids = list(dict.fromkeys(ids))
+
+        if not ids:
+            raise ValidationError({"ids": "Укажите id сотрудников."})
+        if len(ids) > settings.EMPLOYEES_BATCH_MAX_IDS:
+            raise ValidationError({"ids": f"Не больше {settings.EMPLOYEES_BATCH_MAX_IDS} id за запрос."})
+        return ids
+
+    def get(self, request, *args, **kwargs):
+        return self.batch(self.get_ids(request))
+
+    def post(self, request, *args, **kwargs):
+        return self.batch(self.get_ids(request))
+
+    def batch(self, ids):
+        queryset = Employee.objects.select_related("manager").filter(id__in=ids)
+        if settings.EMPLOYEES_FAST_SERIALIZERS:
+            found = {row["id"]: serialize_detail_row(row) for row in queryset.values(*DETAIL_FIELDS)}
+        else:
+            found = {data["id"]: data for data in EmployeeDetailSerializer(queryset, many=True).data}
+        return Response({
+            "results": [found[pk] for pk in ids if pk in found],
+            "missing": [pk for pk in ids if pk not in found],
+        })
+
+
+class EmployeeHierarchyView(APIView):
+    permission_classes = [AllowAny]
+    query_budget = 3
+    min_depth = 0
+
+    def get_max_depth(self, request):
+        limit = settings.EMPLOYEES_HIERARCHY_MAX_DEPTH
+        try:
+            depth = int(request.query_params.get("depth", limit))
+        except ValueError:
+            raise ValidationError({"depth": "Глубина должна быть целым числом."})
+        if depth < 0:
+            raise ValidationError({"depth": "Глубина не может быть отрицательной."})
+        if depth < self.min_depth:
+            raise ValidationError({"depth": f"Глубина должна быть не меньше {self.min_depth}."})
+        return min(depth, limit)
+
+
+class EmployeeSubtreeView(EmployeeHierarchyView):
+    def get(self, request, pk, *args, **kwargs):
+        max_depth = self.get_max_depth(request)
+        rows = get_subtree(pk, max_depth)
+        if not rows:
+            raise NotFound("Сотрудник не найден.")
+        return Response({"id": pk, "depth": max_depth, "count": len(rows) - 1, "results": rows})
+
+
+class EmployeeAncestorsView(EmployeeHierarchyView):
+    def get(self, request, pk, *args, **kwargs):
+        rows = get_ancestors(pk, self.get_max_depth(request))
+        if not rows:
+            raise NotFound("Сотрудник не найден.")
+        return Response({"id": pk, "results": rows[1:]})
+
+
+class EmployeeHeadcountView(EmployeeHierarchyView):
+    query_budget = 5
+    # Branches start at the direct reports, one level down
+    min_depth = 1
+
+    def get(self, request, pk, *args, **kwargs):
+        employee = Employee.objects.filter(pk=pk).values("id", "full_name").first()
+        if employee is None:
+            raise NotFound("Сотрудник не найден.")
+
+        max_depth = self.get_max_depth(request)
+        branches = get_headcount(pk, max_depth)
+        return Response({
+            **employee,
+            "depth": max_depth,
+            "headcount": sum(branch["headcount"] for branch in branches),
+            "direct_reports": len(branches),
+            "branches": branches,
+        })
+
+
+class EmployeeReportsToView(EmployeeHierarchyView):
+    def get(self, request, pk, manager_pk, *args, **kwargs):
+        if not Employee.objects.filter(pk=pk).exists():
+            raise NotFound("Сотрудник не найден.")
+        return Response({"id": pk, "manager_id": manager_pk, "is_subordinate": is_subordinate(pk, manager_pk)})
+
 
 class EmployeeCreateView(CreateAPIView):
     serializer_class = EmployeeCreateSerializer
     permission_classes = [AllowAny]
+    # Token lookup, the insert and the headcount counters
+    query_budget = 3
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -56,6 +330,9 @@ class EmployeeCreateView(CreateAPIView):
 class BulkEmployeeUploadView(APIView):
     parser_classes = [MultiPartParser]
     permission_classes = [AllowAny]
+    # For a file that fits in one chunk; every further chunk writes once more
+    query_budget = 11
+    query_max_repeats = None
 
     def post(self, request, *args, **kwargs):
         file = request.FILES.get("file")
@@ -63,47 +340,105 @@ class BulkEmployeeUploadView(APIView):
             logger.warning("[UPLOAD] Файл не загружен")
             return Response({"error": "Файл не был загружен."}, status=400)
 
-        logger.info(f"[UPLOAD] Файл получен: {file.name} ({file.size} байт)")
+        logger.info("[UPLOAD] Файл получен: %s (%s байт)", file.name, file.size)
 
-        try:
-            decoded_file = file.read().decode("utf-8")
-            reader = csv.DictReader(io.StringIO(decoded_file))
-        except Exception as e:
-            logger.error(f"[UPLOAD] Ошибка чтения файла: {e}")
-            return Response({"error": f"Ошибка при чтении файла: {e}"}, status=400)
+        max_bytes = settings.EMPLOYEES_UPLOAD_MAX_BYTES
+        if file.size > max_bytes:
+            logger.warning("[UPLOAD] Файл слишком большой: %s байт (предел %s)", file.size, max_bytes)
+            return Response({"error": f"Файл слишком большой. Максимальный размер: {max_bytes} байт."}, status=413)
+
+        mode = request.query_params.get("mode", ImportMode.INSERT)
+        if mode not in ImportMode.values:
+            logger.warning("[UPLOAD] Неизвестный режим загрузки: %s", mode)
+            return Response({
+                "error": f"Неизвестный режим загрузки: {mode}. Допустимые: {', '.join(ImportMode.values)}."
+            }, status=400)
 
         user = request.user
         manager = getattr(user, "employee", None) if user.is_authenticated else None
 
         if manager:
-            logger.info(f"[UPLOAD] Создание сотрудников под руководителем: {manager.full_name} (id={manager.id})")
+            logger.info("[UPLOAD] Создание сотрудников под руководителем: %s (id=%s)", manager.full_name, manager.id)
         else:
             logger.info("[UPLOAD] Пользователь без руководителя — manager будет None")
 
-        created = []
-        errors = []
+        if request.query_params.get("async", "").lower() in ("1", "true", "yes"):
+            return self.enqueue(request, file, manager, mode)
+
+        progress = EmployeeImportProgress(total_bytes=file.size)
+        reader = read_csv_rows(file, progress)
 
         try:
-            with transaction.atomic():
-                for index, row in enumerate(reader, start=2):
-                    serializer = EmployeeCreateSerializer(data=row)
-                    if serializer.is_valid():
-                        employee = serializer.save(manager=manager)
-                        created.append(employee.id)
-                        logger.info(f"[UPLOAD] Сотрудник создан: {employee.full_name} (id={employee.id})")
-                    else:
-                        logger.warning(f"[UPLOAD] Ошибка в строке {index}: {serializer.errors}")
-                        errors.append({"line": index, "errors": serializer.errors})
-                        raise ValueError("Ошибка валидации — прерываем загрузку")
+            importer = get_importer(manager=manager, progress=progress, upsert=mode == ImportMode.UPSERT)
+            result = importer.run(reader)
+        except UnicodeDecodeError as e:
+            logger.error("[UPLOAD] Ошибка чтения файла: %s", e)
+            return Response({"error": f"Ошибка при чтении файла: {e}"}, status=400)
         except Exception:
             logger.error("[UPLOAD] Загрузка прервана. Все изменения отменены.")
             return Response({
                 "created_count": 0,
-                "errors": errors or ["Загрузка прервана. Все изменения отменены."]
+                "errors": ["Загрузка прервана. Все изменения отменены."]
             }, status=400)
 
-        logger.info(f"[UPLOAD] Всего создано: {len(created)} сотрудников")
-        return Response({
-            "created_count": len(created),
-            "errors": []
-        }, status=201)
+        if result.errors:
+            logger.error("[UPLOAD] Загрузка прервана. Все изменения отменены.")
+            return Response({
+                "created_count": 0,
+                "errors": result.errors,
+                "rows_processed": progress.rows_processed,
+                "bytes_processed": progress.bytes_processed,
+            }, status=400)
+
+        data = {
+            "created_count": result.created_count,
+            "errors": [],
+            "rows_processed": progress.rows_processed,
+            "bytes_processed": progress.bytes_processed,
+        }
+        if mode == ImportMode.UPSERT:
+            logger.info(
+                "[UPLOAD] Всего создано: %s, обновлено: %s, без изменений: %s",
+                result.created_count, result.updated_count, result.unchanged_count,
+            )
+            data.update(updated_count=result.updated_count, unchanged_count=result.unchanged_count)
+        else:
+            logger.info("[UPLOAD] Всего создано: %s сотрудников", result.created_count)
+        return Response(data, status=201)
+
+    def enqueue(self, request, file, manager, mode):
+        job = ImportJob.objects.create(file=file, manager=manager, mode=mode, total_bytes=file.size)
+        enqueue_import_job(job)
+
+        data = ImportJobSerializer(job).data
+        data["status_url"] = request.build_absolute_uri(reverse("employee-upload-job", args=[job.pk]))
+        return Response(data, status=202)
+
+
+class ImportJobDetailView(RetrieveAPIView):
+    permission_classes = [AllowAny]
+    query_budget = 2
+
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+
+
+def can_read_metrics(request):
+    # The scraper sends EMPLOYEES_METRICS_TOKEN as a bearer token; people need a staff session
+    token = settings.EMPLOYEES_METRICS_TOKEN
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if token and scheme == "Bearer" and constant_time_compare(credentials, token):
+        return True
+    return request.user.is_staff
+
+
+# The scraper's token costs no queries; a staff session is the session and the user lookups
+@query_budget(2)
+@require_GET
+def metrics(request):
+    # Prometheus scrape endpoint with the request metrics of this process. Routes, traffic
+    # and error rates tell a lot about the service, so the endpoint is not public.
+    if not can_read_metrics(request):
+        logger.warning("[METRICS] Доступ запрещён: %s", request.META.get("REMOTE_ADDR"))
+        return HttpResponseForbidden("Доступ запрещён.", content_type="text/plain; charset=utf-8")
+    return HttpResponse(request_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")